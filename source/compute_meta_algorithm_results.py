@@ -30,14 +30,19 @@
 ############################################################################
 
 
-from toolkit.utils.option_parser import OptionParser, AlgorithmOps, SceneOps, MetaAlgorithmOps
+from toolkit.utils.option_parser import OptionParser, AlgorithmOps, SceneOps, MetaAlgorithmOps, \
+    PrecisionOps
 
 
 def main():
-    parser = OptionParser([AlgorithmOps(), SceneOps(), MetaAlgorithmOps(with_load_argument=False)])
-    algorithms, scenes, meta_algorithms = parser.parse_args()
+    parser = OptionParser([AlgorithmOps(), SceneOps(), MetaAlgorithmOps(with_load_argument=False),
+                           PrecisionOps()])
+    algorithms, scenes, meta_algorithms, precision = parser.parse_args()
 
+    from toolkit import settings
     from toolkit.algorithms import MetaAlgorithm
+
+    settings.FLOAT_PRECISION = precision
     MetaAlgorithm.prepare_meta_algorithms(meta_algorithms, algorithms, scenes)
 
 
@@ -33,13 +33,14 @@
 import os.path as op
 
 from toolkit.utils.option_parser import OptionParser, SceneOps, AlgorithmOps, MetricOps, \
-    VisualizationOps, MetaAlgorithmOps, OverwriteOps
+    VisualizationOps, MetaAlgorithmOps, OverwriteOps, PrecisionOps, MemoryOps
 
 
 def main():
-    parser = OptionParser([SceneOps(), AlgorithmOps(), MetricOps(),
-                           VisualizationOps(), OverwriteOps(), MetaAlgorithmOps(default=[])])
-    scenes, algorithms, metrics, with_vis, add_to_existing, meta_algorithms, compute_meta_algos = parser.parse_args()
+    parser = OptionParser([SceneOps(), AlgorithmOps(), MetricOps(), VisualizationOps(),
+                           OverwriteOps(), MetaAlgorithmOps(default=[]), PrecisionOps(), MemoryOps()])
+    scenes, algorithms, metrics, with_vis, add_to_existing, meta_algorithms, compute_meta_algos, \
+        precision, memory_budget = parser.parse_args()
 
     # delay import to speed up usage response
     from toolkit import settings
@@ -47,6 +48,10 @@ def main():
     from toolkit.evaluations import submission_evaluation
     from toolkit.utils import misc
 
+    # global policies for all evaluations
+    settings.FLOAT_PRECISION = precision
+    settings.EVALUATION_MEMORY_MB = memory_budget
+
     if compute_meta_algos and meta_algorithms:
         MetaAlgorithm.prepare_meta_algorithms(meta_algorithms, algorithms, scenes)
 
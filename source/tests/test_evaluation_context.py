@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+
+import unittest
+
+import numpy as np
+
+from toolkit.metrics import BumpinessContinSurf, BumpinessPlanes, EvaluationContext, EvaluationPlan
+from toolkit.utils.packed_mask import PackedMask
+
+
+class MaskScene(object):
+    # scene with the given evaluation masks and without boundary
+
+    def __init__(self, masks):
+        self.masks = dict((name, PackedMask.from_bool(mask)) for name, mask in masks.items())
+        self.shape = np.shape(masks.values()[0])
+
+    def get_packed_mask(self, mask_name):
+        return self.masks[mask_name]
+
+    def get_packed_boundary_mask(self, ignore_boundary=True):
+        return PackedMask.full(self.shape, True)
+
+    def is_gt(self, data):
+        return False
+
+
+class TestSharedFilteredIntermediates(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.gt = rng.uniform(0, 1, size=(64, 64)).astype(np.float32)
+        self.algo_result = self.gt + rng.normal(0, 0.01, size=(64, 64)).astype(np.float32)
+
+        # masks with different bounding boxes
+        mask_planes = np.zeros((64, 64), dtype=np.bool)
+        mask_planes[5:20, 5:30] = True
+        mask_smooth_surfaces = np.zeros((64, 64), dtype=np.bool)
+        mask_smooth_surfaces[30:50, 20:60] = True
+        self.scene = MaskScene({"mask_planes": mask_planes, "mask_smooth_surfaces": mask_smooth_surfaces})
+
+        self.n_calls = 0
+        self.get_hessian_norm = BumpinessPlanes.get_hessian_norm
+
+        def get_hessian_norm(diff):
+            self.n_calls += 1
+            return self.get_hessian_norm(diff)
+
+        BumpinessPlanes.get_hessian_norm = staticmethod(get_hessian_norm)
+
+    def tearDown(self):
+        BumpinessPlanes.get_hessian_norm = staticmethod(self.get_hessian_norm)
+
+    def get_scores(self, metrics, context):
+        return dict((metric, metric.get_score_from_roi(context))
+                    for metric in EvaluationPlan(metrics).get_metrics(context))
+
+    def test_filter_is_applied_once_for_metrics_with_different_masks(self):
+        metrics = [BumpinessPlanes(), BumpinessContinSurf()]
+        context = EvaluationContext(self.algo_result, self.gt, self.scene, metrics=metrics)
+        scores = self.get_scores(metrics, context)
+        self.assertEqual(self.n_calls, 1)
+
+        # same scores as with the computation on the region of interest of each metric
+        for metric in metrics:
+            self.n_calls = 0
+            self.assertEqual(scores[metric], metric.get_score(self.algo_result, self.gt, self.scene))
+            self.assertEqual(self.n_calls, 1)
+
+    def test_same_scores_as_on_full_frame(self):
+        metrics = [BumpinessPlanes(), BumpinessContinSurf()]
+        context = EvaluationContext(self.algo_result, self.gt, self.scene, metrics=metrics)
+        scores = self.get_scores(metrics, context)
+
+        for metric in metrics:
+            bumpiness = metric.get_bumpiness(self.gt, self.algo_result)
+            mask = metric.get_evaluation_mask(self.scene)
+            expected = metric.factor * np.sum(bumpiness[mask], dtype=np.float64) / float(np.sum(mask))
+            self.assertAlmostEqual(scores[metric], expected, places=12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+
+import unittest
+
+import numpy as np
+
+from toolkit.metrics import BadPix, MSE, Quantile
+from toolkit.metrics.stacked_scores import get_stacked_scores_from_diffs
+
+
+class TestStackedScores(unittest.TestCase):
+
+    def test_empty_evaluation_mask(self):
+        metrics = [MSE(), BadPix(0.07), Quantile(25), Quantile(100)]
+        scores = get_stacked_scores_from_diffs(np.zeros((3, 0), dtype=np.float32), metrics)
+        self.assertEqual(np.shape(scores), (4, 3))
+        self.assertTrue(np.all(np.isnan(scores)))
+
+    def test_100th_percentile_is_maximum(self):
+        diffs = np.random.RandomState(0).uniform(-1, 1, size=(3, 50))
+        scores = get_stacked_scores_from_diffs(diffs, [Quantile(50), Quantile(100)])
+
+        np.testing.assert_array_equal(scores[1], np.max(np.abs(diffs), axis=1) * 100)
+        for idx_a in range(3):
+            expected = Quantile.get_scores_from_diffs(diffs[idx_a], [50, 100]) * 100
+            np.testing.assert_array_equal(scores[:, idx_a], expected)
+
+    def test_100th_percentile_with_invalid_differences(self):
+        diffs = np.random.RandomState(1).uniform(-1, 1, size=(2, 50))
+        diffs[0, :10] = np.nan
+        diffs[1, :] = np.inf
+        scores = get_stacked_scores_from_diffs(diffs, [Quantile(100)])
+
+        self.assertEqual(scores[0, 0], np.max(np.abs(diffs[0, 10:])) * 100)
+        self.assertTrue(np.isnan(scores[0, 1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
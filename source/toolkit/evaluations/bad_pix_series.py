@@ -38,7 +38,7 @@ import numpy as np
 
 from toolkit import settings
 from toolkit.metrics import BadPix
-from toolkit.utils import log, misc, plotting, file_io
+from toolkit.utils import fingerprints, log, misc, plotting, file_io
 
 
 THRESHOLDS = np.arange(0, 0.102, 0.002)
@@ -53,20 +53,26 @@ def plot(algorithms, scenes, thresholds=THRESHOLDS, with_cached_scores=False,
          penalize_missing_pixels=False, title=None, subdir="bad_pix_series", fig_name=None,
          fig_size=(16, 6), legend_pos=(1.19, -0.04), marker_size=2.3, fs=16):
 
-    # prepare scores
+    # prepare scores, cached scores are recomputed if any input changed
     fname_scores = get_fname_scores(scenes)
-    if not op.isfile(fname_scores) or not with_cached_scores:
+    input_files = get_input_files(algorithms, scenes)
+    parameters = ([a.get_name() for a in algorithms], list(thresholds), penalize_missing_pixels)
+
+    if not with_cached_scores or fingerprints.index.is_stale(fname_scores, input_files, parameters):
         percentages_algo_thresh = compute_scores(algorithms, scenes, thresholds,
                                                  penalize_missing_pixels=penalize_missing_pixels)
         if with_cached_scores:
-            fname_scores = get_fname_scores(scenes)
             file_io.check_dir_for_fname(fname_scores)
             with open(fname_scores, "w") as f:
                 pickle.dump(percentages_algo_thresh, f)
+            fingerprints.index.set_up_to_date(fname_scores, input_files, parameters)
     else:
         with open(fname_scores, "r") as f:
             percentages_algo_thresh = pickle.load(f)
 
+    if with_cached_scores:
+        fingerprints.index.save()
+
     # prepare figure
     fig = plt.figure(figsize=fig_size)
     x_ticks = np.arange(len(thresholds))
@@ -107,6 +113,15 @@ def plot(algorithms, scenes, thresholds=THRESHOLDS, with_cached_scores=False,
     plotting.save_tight_figure(fig, fig_path, hide_frames=False, remove_ticks=False, hspace=0.07)
 
 
+def get_input_files(algorithms, scenes):
+    input_files = []
+    for scene in scenes:
+        input_files += fingerprints.get_scene_files(scene)
+        input_files += [misc.get_fname_algo_result(misc.get_path_to_algo_data(algorithm), scene)
+                        for algorithm in algorithms]
+    return input_files
+
+
 def compute_scores(algorithms, scenes, thresholds=THRESHOLDS, penalize_missing_pixels=True):
     percentages_algo_thresh = np.full((len(algorithms), len(thresholds)), fill_value=np.nan)
     bad_pix_metric = BadPix()
@@ -133,10 +148,8 @@ def compute_scores(algorithms, scenes, thresholds=THRESHOLDS, penalize_missing_p
 
             combined_diffs = np.concatenate((combined_diffs, diffs))
 
-        # compute BadPix score for each threshold
-        for idx_t, t in enumerate(thresholds):
-            bad_pix_metric.thresh = t
-            bad_pix_score = bad_pix_metric.get_score_from_diffs(combined_diffs)
-            percentages_algo_thresh[idx_a, idx_t] = 100 - bad_pix_score
+        # compute BadPix scores for all thresholds at once
+        bad_pix_scores = BadPix.get_scores_from_diffs(combined_diffs, thresholds)
+        percentages_algo_thresh[idx_a, :] = 100 - bad_pix_scores
 
     return percentages_algo_thresh
@@ -30,6 +30,8 @@
 ############################################################################
 
 
+import copy
+from multiprocessing.pool import ThreadPool
 import shutil
 import os.path as op
 
@@ -38,7 +40,8 @@ from matplotlib import ticker
 import numpy as np
 
 from toolkit import settings
-from toolkit.utils import file_io, log, misc, plotting
+from toolkit.metrics import EvaluationContext, EvaluationPlan, get_tiled_scores
+from toolkit.utils import data_cache, file_io, log, misc, plotting
 
 
 def evaluate(evaluation_output_path, algorithm_input_path, scenes, metrics,
@@ -72,11 +75,28 @@ def evaluate(evaluation_output_path, algorithm_input_path, scenes, metrics,
         except IOError:
             pass
 
+    # read data of upcoming scenes in the background while the current scene is evaluated
+    prefetch_depth = settings.PREFETCH_DEPTH
+    pool = ThreadPool(processes=prefetch_depth) if prefetch_depth > 0 else None
+    prefetched = []
+    idx_next = 0
+
     # evaluate
-    for scene in scenes:
+    for idx_s, scene in enumerate(scenes):
         scene_data = eval_json.get(scene.get_name(), dict())
 
+        current = None
+        if prefetched and prefetched[0][0] == idx_s:
+            current = prefetched.pop(0)
+        if pool is not None:
+            idx_next = prefetch(pool, scenes, idx_s, max(idx_next, idx_s + 1), prefetched,
+                                metrics, algorithm_input_path)
+
         try:
+            algo_result = None
+            if current is not None:
+                algo_result = current[2].get()
+
             if visualize:
                 log.info("Visualizing algorithm result on %s" % scene.get_display_name())
                 scene_data["algorithm_result"] = visualize_algo_result(scene, algorithm_input_path,
@@ -84,7 +104,8 @@ def evaluate(evaluation_output_path, algorithm_input_path, scenes, metrics,
 
             log.info("Processing scene: %s" % scene.get_display_name())
             log.info("Using data from:\n  %s" % scene.get_data_path())
-            scene_scores = compute_scores(scene, metrics, algorithm_input_path, evaluation_output_path, visualize)
+            scene_scores = compute_scores(scene, metrics, algorithm_input_path, evaluation_output_path, visualize,
+                                          algo_result=algo_result)
 
             if add_to_existing_results:
                 existing_scores = scene_data.get("scores", dict())
@@ -100,6 +121,10 @@ def evaluate(evaluation_output_path, algorithm_input_path, scenes, metrics,
 
         eval_json[scene.get_name()] = scene_data
 
+    if pool is not None:
+        pool.close()
+        pool.join()
+
     # save json with scores and paths to visualizations
     file_io.write_file(eval_json, file_name_results)
     log.info("Done!")
@@ -109,6 +134,83 @@ def evaluate(evaluation_output_path, algorithm_input_path, scenes, metrics,
     return success, error_json
 
 
+def prefetch(pool, scenes, idx_current, idx_next, prefetched, metrics, algo_dir):
+    """
+    Start reading scenes from idx_next on in the background, at most PREFETCH_DEPTH scenes ahead
+    of the current scene and only as long as their data fits into the scene data cache next to the
+    data of the current scene. Appends (index, bytes, async result) to prefetched
+    and returns the index of the first scene which is not prefetched.
+    """
+    max_bytes = data_cache.scene_data.max_bytes - get_n_bytes_of_scene_data(scenes[idx_current], metrics)
+    n_bytes = sum(n_bytes_scene for _, n_bytes_scene, _ in prefetched)
+
+    while idx_next < len(scenes) and idx_next - idx_current <= settings.PREFETCH_DEPTH:
+        scene = scenes[idx_next]
+        n_bytes_scene = get_n_bytes_of_scene_data(scene, metrics)
+        if n_bytes + n_bytes_scene > max_bytes:
+            break
+
+        # metrics are selected in the calling thread, the selection modifies the metric objects
+        low_res_metrics = scene.get_applicable_metrics_low_res(metrics)
+        high_res_metrics = scene.get_applicable_metrics_high_res(metrics)
+        result = pool.apply_async(load_scene_data,
+                                  (copy.copy(scene), low_res_metrics, high_res_metrics, algo_dir))
+        prefetched.append((idx_next, n_bytes_scene, result))
+        n_bytes += n_bytes_scene
+        idx_next += 1
+
+    return idx_next
+
+
+def get_n_bytes_of_scene_data(scene, metrics):
+    # estimated size of the ground truth and the packed evaluation masks per resolution,
+    # plus the algorithm result at low resolution
+    scene = copy.copy(scene)
+    item_size = np.dtype(misc.get_float_dtype()).itemsize
+    n_bytes = 0
+
+    low_res_metrics = scene.get_applicable_metrics_low_res(metrics)
+    high_res_metrics = scene.get_applicable_metrics_high_res(metrics)
+
+    for set_gt_scale, applicable_metrics in [(scene.set_low_gt_scale, low_res_metrics),
+                                             (scene.set_high_gt_scale, high_res_metrics)]:
+        if applicable_metrics:
+            set_gt_scale()
+            n_pixels = scene.get_height() * scene.get_width()
+            n_masks = len(set(m.mask_name for m in applicable_metrics)) + len(applicable_metrics)
+            n_bytes += n_pixels * item_size + n_masks * n_pixels // 8
+
+    scene.set_low_gt_scale()
+    return n_bytes + scene.get_height() * scene.get_width() * item_size
+
+
+def load_scene_data(scene, low_res_metrics, high_res_metrics, algo_dir):
+    """
+    Load ground truth and evaluation masks into the scene data cache.
+    Returns the algorithm result at its original resolution or None if anything could not be read,
+    in which case the evaluation loads the data itself and handles the error as usual.
+    """
+    try:
+        if low_res_metrics:
+            scene.set_low_gt_scale()
+            load_evaluation_data(scene, low_res_metrics)
+
+        if high_res_metrics:
+            scene.set_high_gt_scale()
+            load_evaluation_data(scene, high_res_metrics)
+
+        return file_io.read_file(misc.get_fname_algo_result(algo_dir, scene))
+    except IOError:
+        return None
+
+
+def load_evaluation_data(scene, metrics):
+    scene.get_gt()
+    scene.load_packed_masks([m.mask_name for m in metrics if m.mask_name is not None])
+    for metric in metrics:
+        metric.get_packed_evaluation_mask(scene)
+
+
 def get_relative_path(scene, descr, file_type=settings.FIG_TYPE):
     return "%s/%s_%s.%s" % (scene.get_category(), scene.get_name(), descr, file_type)
 
@@ -145,19 +247,19 @@ def visualize_algo_result(scene, algo_dir, tgt_dir, add_pfms_to_result):
     return disp_map_data
 
 
-def compute_scores(scene, metrics, algo_dir, tgt_dir, visualize):
+def compute_scores(scene, metrics, algo_dir, tgt_dir, visualize, algo_result=None):
     scores = dict()
 
     # resolution for evaluation depends on metric
     low_res_metrics = scene.get_applicable_metrics_low_res(metrics)
     if low_res_metrics:
         scene.set_low_gt_scale()
-        scores = add_scores(low_res_metrics, scene, algo_dir, tgt_dir, scores, visualize)
+        scores = add_scores(low_res_metrics, scene, algo_dir, tgt_dir, scores, visualize, algo_result)
 
     high_res_metrics = scene.get_applicable_metrics_high_res(metrics)
     if high_res_metrics:
         scene.set_high_gt_scale()
-        scores = add_scores(high_res_metrics, scene, algo_dir, tgt_dir, scores, visualize)
+        scores = add_scores(high_res_metrics, scene, algo_dir, tgt_dir, scores, visualize, algo_result)
 
     scores = add_runtime(scene, algo_dir, scores, metrics)
 
@@ -174,23 +276,46 @@ def add_runtime(scene, algo_dir, scores, metrics):
     return scores
 
 
-def add_scores(metrics, scene, algo_dir, tgt_dir, scores, visualize):
+def add_scores(metrics, scene, algo_dir, tgt_dir, scores, visualize, algo_result=None):
     gt = scene.get_gt()
-    algo_result = misc.get_algo_result_from_dir(algo_dir, scene)
-
-    for metric in metrics:
-
-        if visualize:
-            score, vis = metric.get_score(algo_result, gt, scene, with_visualization=True)
-            relative_fname = save_visualization(algo_result, vis, metric, scene, tgt_dir)
-            metric_data = {"value": float(score), "visualization": {"thumb": relative_fname}}
+    # with settings.UPSAMPLE_BY_BLOCKS, metrics broadcast the low resolution result to the ground truth
+    if algo_result is None:
+        algo_result = misc.get_algo_result_from_dir(algo_dir, scene, upsample=False)
+    else:
+        # prefetched algorithm results are read at their original resolution
+        algo_result = misc.upsample_algo_result(algo_result, scene, upsample=False)
+    # intermediate results are shared by all metrics of this resolution
+    context = EvaluationContext(algo_result, gt, scene, metrics=metrics)
+
+    # without visualizations, scores may be computed on stripes within the memory budget
+    tiled_results = dict()
+    if not visualize and settings.EVALUATION_MEMORY_MB is not None:
+        tiled_metrics = [m for m in metrics if m.tiling is not None]
+        tiled_results = get_tiled_scores(algo_result, gt, scene, tiled_metrics,
+                                         int(settings.EVALUATION_MEMORY_MB * 1024 ** 2))
+
+    # metrics which share intermediate results are evaluated one after another,
+    # intermediate results are released as soon as they are not required anymore
+    for metric in EvaluationPlan(metrics).get_metrics(context):
+
+        if metric in tiled_results:
+            score, additional_results = tiled_results[metric]
+            metric_data = {"value": float(score)}
         else:
-            score = metric.get_score(algo_result, gt, scene)
+            # the visualization is only built if it is saved, before the intermediates are released
+            result = metric.get_result_from_roi(context)
+            score = result.score
             metric_data = {"value": float(score)}
+            if visualize:
+                relative_fname = save_visualization(algo_result, result.get_visualization(),
+                                                    metric, scene, tgt_dir)
+                metric_data["visualization"] = {"thumb": relative_fname}
+            additional_results = metric.get_additional_results(context)
 
         log.info("Score %5.2f for: %s, %s, Scale: %0.2f" %
                  (score, metric.get_display_name(), scene.get_display_name(), scene.gt_scale))
 
+        metric_data.update(additional_results)
         scores[metric.get_id()] = metric_data
 
     return scores
@@ -199,8 +324,10 @@ def add_scores(metrics, scene, algo_dir, tgt_dir, scores, visualize):
 def save_visualization(algo_result, metric_vis, metric, scene, tgt_dir):
     fig = init_figure()
 
-    # algorithm result as background
-    plt.imshow(algo_result, **settings.disp_map_args(scene, cmap="gray"))
+    # algorithm result as background, stretched to the resolution of the visualization
+    height, width = np.shape(metric_vis)[:2]
+    plt.imshow(algo_result, extent=(-0.5, width - 0.5, height - 0.5, -0.5),
+               **settings.disp_map_args(scene, cmap="gray"))
 
     # metric visualization on top
     if scene.hidden_gt() and metric.pixelize_results() and settings.PIXELIZE:
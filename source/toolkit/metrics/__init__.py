@@ -1,3 +1,7 @@
+from toolkit.metrics.evaluation_context import EvaluationContext
+from toolkit.metrics.evaluation_plan import EvaluationPlan
+from toolkit.metrics.metric_result import MetricResult
+
 from toolkit.metrics.general_metrics import BaseMetric, BadPix, MSE, Runtime, Quantile
 
 from toolkit.metrics.region_metrics import Discontinuities, FineFattening, FineThinning, \
@@ -6,3 +10,7 @@ from toolkit.metrics.region_metrics import Discontinuities, FineFattening, FineT
 from toolkit.metrics.stratified_metrics import BackgammonThinning, BackgammonFattening, MissedDots, \
     DotsBackgroundMSE, PyramidsParallelBumpiness, PyramidsSlantedBumpiness, \
     StripesLowTexture, BrightStripes, DarkStripes
+
+from toolkit.metrics.stacked_scores import get_stacked_scores, get_stacked_scores_for_algorithms
+
+from toolkit.metrics.tiled_evaluation import get_tiled_scores
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+
+import numpy as np
+
+from toolkit.metrics import masked_reductions
+from toolkit.utils import misc
+
+
+# intermediate results which are computed from other intermediate results
+DEPENDENCIES = {
+    "abs_diff": ("diff",),
+    "mask_valid_diff": ("diff",),
+    "mask_valid_inputs": ("mask_valid_gt",),
+    "sorted_abs_diffs": ("abs_diff", "evaluation_mask"),
+    "quantiles": ("abs_diff", "mask_valid_diff", "evaluation_mask"),
+    "hessian_norm": ("diff",),
+}
+
+
+class EvaluationContext(object):
+    """
+    Intermediate results for one algorithm result on one scene at the current gt_scale.
+    Each intermediate is computed on first access and then shared by all metrics.
+    The returned arrays are read-only.
+
+    With a region of interest, all arrays are cropped to roi = (rows, cols) of the
+    full frame, given in ground truth resolution and aligned to low resolution blocks.
+    Rows may also be an array of row indices, e.g. for stripes which wrap around the image.
+    With core, a slice of the rows of the region of interest, the evaluation masks are
+    restricted to these rows. The other rows only provide the halo for filters.
+
+    Masked reductions of the metrics write their temporary arrays to scratch buffers
+    of the context, which are allocated once and reused by all metrics.
+
+    Metrics are evaluated on contexts of their own region of interest, see get_roi_context.
+    Intermediates of filters, e.g. the Hessian norm, are computed once on the union of the
+    regions of interest of the given metrics which require them and cropped for each metric.
+    """
+
+    def __init__(self, algo_result, gt, scene, roi=None, core=None, metrics=()):
+        self.frame_gt = gt
+        # the ground truth of the scene allows to use its cached derived data, e.g. normals
+        self.is_scene_gt = scene.is_gt(gt)
+        self.frame_shape = np.shape(gt)[0:2]
+        self.roi = roi
+        self.core = core
+
+        if roi is not None:
+            factor = np.shape(gt)[0] // np.shape(algo_result)[0]
+            algo_result = algo_result[tuple(get_low_res_index(index, factor) for index in roi)]
+            gt = gt[roi]
+
+        self.algo_result = algo_result
+        self.gt = gt
+        self.scene = scene
+        self.intermediates = dict()
+        self.buffers = dict()
+        self.metrics = metrics
+        # full frame context of a region of interest
+        self.parent = None
+
+    def get_roi_context(self, metric):
+        """
+        Context on the bounding box of the evaluation mask of the metric, including the
+        halo which the metric requires for filtering. Scores are the same as on the full frame.
+        """
+        if metric.roi_halo is None or self.roi is not None:
+            return self
+
+        bounds = self.get_roi_bounds(metric)
+        if bounds is None:
+            return self
+
+        # metrics with the same region of interest share the context
+        return self._get(("roi_context", bounds), lambda: self._create_roi_context(bounds))
+
+    def get_roi_bounds(self, metric):
+        # ((start, stop), (start, stop)) of the region of interest, None for the full frame
+        key = ("roi", type(metric), metric.mask_name, metric.roi_halo, metric.roi_periodic)
+        return self._get(key, lambda: self._get_roi_bounds(metric))
+
+    def _create_roi_context(self, bounds):
+        roi = tuple(slice(start, stop) for start, stop in bounds)
+        context = EvaluationContext(self.algo_result, self.gt, self.scene, roi)
+        context.parent = self
+        return context
+
+    def _get_roi_bounds(self, metric):
+        bounding_box = metric.get_packed_evaluation_mask(self.scene).get_bounding_box()
+        if bounding_box is None:
+            return None
+
+        factor = self.frame_shape[0] // np.shape(self.algo_result)[0]
+        bounds = []
+
+        for (start, stop), size in zip(bounding_box, self.frame_shape):
+            start = max(start - metric.roi_halo, 0)
+            stop = min(stop + metric.roi_halo, size)
+
+            # periodic filters require the opposite image border
+            if metric.roi_periodic and (start == 0 or stop == size):
+                start, stop = 0, size
+
+            # low resolution algorithm results are cropped at block boundaries
+            start -= start % factor
+            stop = min(stop + (-stop) % factor, size)
+            bounds.append((start, stop))
+
+        if bounds == [(0, size) for size in self.frame_shape]:
+            return None
+        return tuple(bounds)
+
+    def get_shared_context(self, name):
+        """
+        Context on the union of the regions of interest of the metrics which require the
+        intermediate with the given name, None if none of the metrics of the context does.
+        """
+        bounds = self._get(("roi", "shared", name), lambda: self._get_shared_bounds(name))
+        if bounds is None:
+            return None
+        if bounds == tuple((0, size) for size in self.frame_shape):
+            return self
+        return self._get(("roi_context", bounds), lambda: self._create_roi_context(bounds))
+
+    def _get_shared_bounds(self, name):
+        metrics = [m for m in self.metrics if m.roi_halo is not None and name in m.intermediates]
+        if not metrics:
+            return None
+
+        # the bounds are aligned to low resolution blocks, hence their union is as well
+        full_frame = tuple((0, size) for size in self.frame_shape)
+        all_bounds = [self.get_roi_bounds(metric) or full_frame for metric in metrics]
+        return tuple((min(b[axis][0] for b in all_bounds), max(b[axis][1] for b in all_bounds))
+                     for axis in range(2))
+
+    def get_filtered_intermediate(self, name, compute):
+        """
+        Intermediate of a filter with a halo, computed with compute(context) on the shared context
+        of the full frame context and cropped to the region of interest. Scores are the same as
+        with the computation on the region of interest itself, which is the fallback.
+        """
+        shared_context = None if self.parent is None else self.parent.get_shared_context(name)
+        if shared_context is None or shared_context is self or not shared_context.contains(self):
+            return self._get((name,), lambda: compute(self))
+
+        data = shared_context.get_filtered_intermediate(name, compute)
+        return self._get((name,), lambda: shared_context.crop_to(data, self))
+
+    def contains(self, context):
+        # whether the region of interest of the context lies within the region of interest of self
+        if self.roi is None:
+            return True
+        return all(outer.start <= inner.start and inner.stop <= outer.stop
+                   for inner, outer in zip(context.roi, self.roi))
+
+    def crop_to(self, data, context):
+        # crop data of the region of interest of self to the region of interest of the given context
+        if self.roi is None:
+            return context.crop(data)
+        return data[tuple(slice(inner.start - outer.start, inner.stop - outer.start)
+                          for inner, outer in zip(context.roi, self.roi))]
+
+    def crop(self, data):
+        # crop full frame data to the region of interest
+        if self.roi is None:
+            return data
+        return data[self.roi]
+
+    def get_full_frame(self, vis):
+        # embed a visualization of the region of interest into the full frame, other pixels are masked
+        if self.roi is None:
+            return vis
+
+        shape = self.frame_shape + np.shape(vis)[2:]
+        full_frame = np.ma.masked_array(np.zeros(shape, dtype=vis.dtype), mask=np.ones(shape, dtype=np.bool))
+        full_frame[self.roi] = vis
+        return full_frame
+
+    def get_diff(self):
+        # algo_result - gt, low resolution algorithm results are broadcast to the ground truth
+        return self._get("diff", lambda: misc.apply_upsampled(np.subtract, self.algo_result, self.gt))
+
+    def get_abs_diff(self):
+        return self._get("abs_diff", lambda: np.abs(self.get_diff()))
+
+    def get_mask_valid_diff(self):
+        return self._get("mask_valid_diff", lambda: misc.get_mask_valid(self.get_diff()))
+
+    def get_mask_valid_gt(self):
+        return self._get("mask_valid_gt", lambda: misc.get_mask_valid(self.gt))
+
+    def get_mask_valid_inputs(self):
+        # valid algorithm result and valid ground truth
+        return self._get("mask_valid_inputs",
+                         lambda: misc.apply_upsampled(lambda a, m: misc.get_mask_valid(a) * m,
+                                                      self.algo_result, self.get_mask_valid_gt()))
+
+    def get_evaluation_mask(self, metric, ignore_boundary=True):
+        # metrics of the same type and region share their evaluation mask
+        key = ("evaluation_mask", type(metric), metric.mask_name, ignore_boundary)
+        return self._get(key, lambda: self._get_evaluation_mask(metric, ignore_boundary))
+
+    def _get_evaluation_mask(self, metric, ignore_boundary):
+        if self.roi is None:
+            return metric.get_evaluation_mask(self.scene, ignore_boundary)
+
+        # only the rows of the region of interest are unpacked
+        rows, cols = self.roi
+        mask = metric.get_packed_evaluation_mask(self.scene, ignore_boundary)[rows].to_bool()
+        mask = np.ascontiguousarray(mask[:, cols])
+
+        if self.core is not None:
+            mask[:self.core.start] = False
+            mask[self.core.stop:] = False
+        return mask
+
+    def get_sorted_abs_diffs(self, metric):
+        # absolute differences within the evaluation mask in ascending order, NaN is left out
+        # as it is never a bad pixel, infinite differences are kept at the end
+        key = ("sorted_abs_diffs", type(metric), metric.mask_name)
+        return self._get(key, lambda: self._get_sorted_abs_diffs(metric))
+
+    def _get_sorted_abs_diffs(self, metric):
+        abs_diffs = self.get_abs_diff()
+        mask = masked_reductions.get_mask_not_nan(abs_diffs, [self.get_evaluation_mask(metric)],
+                                                  out=self.get_buffer("mask"))
+        abs_diffs = masked_reductions.get_selection(abs_diffs, mask)
+        abs_diffs.sort()
+        return abs_diffs
+
+    def get_buffer(self, name, dtype=np.bool, shape=None):
+        # scratch array in the shape of the ground truth, or the given shape, reused by all metrics,
+        # its content is only valid until the next metric requests the same buffer
+        if shape is None:
+            shape = np.shape(self.gt)[0:2]
+        key = (name, np.dtype(dtype), tuple(shape))
+        try:
+            return self.buffers[key]
+        except KeyError:
+            buffer = self.buffers[key] = np.empty(shape, dtype=dtype)
+            return buffer
+
+    def get_intermediate(self, key, compute):
+        # metric specific intermediates, the key has to identify the computation
+        return self._get(key, compute)
+
+    def release(self, name):
+        # drop all intermediates with the given name, also from the regions of interest
+        for key, data in list(self.intermediates.items()):
+            if isinstance(data, EvaluationContext):
+                data.release(name)
+            if key == name or (isinstance(key, tuple) and key[0] == name):
+                del self.intermediates[key]
+
+    def _get(self, key, compute):
+        try:
+            return self.intermediates[key]
+        except KeyError:
+            pass
+
+        data = compute()
+        if isinstance(data, np.ndarray):
+            data.flags.writeable = False
+        self.intermediates[key] = data
+        return data
+
+
+def get_low_res_index(index, factor):
+    # full frame indices are aligned to blocks of low resolution pixels
+    if isinstance(index, slice):
+        return slice(index.start // factor, index.stop // factor)
+    return index[::factor] // factor
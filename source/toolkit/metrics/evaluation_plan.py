@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+from toolkit.metrics.evaluation_context import DEPENDENCIES
+
+
+class EvaluationPlan(object):
+    """
+    Order in which metrics are evaluated on one evaluation context.
+    Metrics which share intermediate results are evaluated one after another and each
+    intermediate result is released from the context as soon as its last metric is done.
+    """
+
+    def __init__(self, metrics):
+        self.requirements = dict((metric, self.get_requirements(metric)) for metric in metrics)
+        self.metrics = self.get_order(metrics)
+
+        # intermediates are released after the last metric which requires them
+        last_metric = dict()
+        for metric in self.metrics:
+            for name in self.requirements[metric]:
+                last_metric[name] = metric
+        self.releases = dict((metric, sorted(name for name, last in last_metric.items() if last == metric))
+                             for metric in self.metrics)
+
+    def get_metrics(self, context):
+        # yields the metrics in order, intermediates are released when the caller is done with a metric
+        for metric in self.metrics:
+            yield metric
+            for name in self.releases[metric]:
+                context.release(name)
+
+    @staticmethod
+    def get_requirements(metric):
+        # all intermediates which are computed for the metric, including their dependencies
+        requirements = set()
+        names = list(metric.intermediates)
+        if metric.roi_halo is not None:
+            names += ["roi", "roi_context"]
+
+        while names:
+            name = names.pop()
+            if name not in requirements:
+                requirements.add(name)
+                names.extend(DEPENDENCIES.get(name, ()))
+
+        return requirements
+
+    def get_order(self, metrics):
+        # greedy: next metric with most requirements which are already computed, otherwise in given order
+        remaining = list(metrics)
+        computed = set()
+        order = []
+
+        while remaining:
+            metric = max(remaining, key=lambda m: len(self.requirements[m] & computed))
+            remaining.remove(metric)
+            order.append(metric)
+
+            # intermediates which are not required anymore are released
+            required = set().union(*[self.requirements[m] for m in remaining])
+            computed = (computed | self.requirements[metric]) & required
+
+        return order
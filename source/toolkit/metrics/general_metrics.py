@@ -31,11 +31,11 @@
 
 
 import abc
-import os.path as op
 
 import numpy as np
 
 from toolkit import settings
+from toolkit.metrics import EvaluationContext, MetricResult, masked_reductions
 from toolkit.utils import misc, plotting
 
 
@@ -49,6 +49,20 @@ class BaseMetric(object):
         self.mask_name = None
         self.category = settings.GENERAL_METRIC
 
+        # pixels around the evaluation mask which are required to compute the score,
+        # None if the metric is evaluated on the full frame
+        self.roi_halo = None
+        self.roi_periodic = False
+
+        # tiled evaluation on stripes of rows: the score is either reduced from additive sums
+        # ("sums": get_score_sums_from_context, get_score_from_sums) or from order statistics
+        # of values ("selection": get_selection_from_context, get_ranks, get_score_from_order_statistics)
+        self.tiling = None
+
+        # intermediate results of the evaluation context which the metric requires,
+        # see evaluation_context.DEPENDENCIES and EvaluationPlan
+        self.intermediates = ()
+
         # default: evaluate on low/original scene resolution
         self.eval_on_high_res = eval_on_high_res
 
@@ -96,9 +110,45 @@ class BaseMetric(object):
     def get_category(self):
         return self.category
 
+    def get_score(self, algo_result, gt, scene, with_visualization=False):
+        context = EvaluationContext(algo_result, gt, scene)
+        return self.get_score_from_roi(context, with_visualization=with_visualization)
+
+    def get_score_from_roi(self, context, with_visualization=False):
+        result = self.get_result_from_roi(context)
+        if not with_visualization:
+            return result.score
+        return result.score, result.get_visualization()
+
+    def get_result(self, algo_result, gt, scene):
+        return self.get_result_from_roi(EvaluationContext(algo_result, gt, scene))
+
+    def get_result_from_roi(self, context):
+        # metrics implement get_score_from_context and get_visualization_from_context,
+        # they are evaluated on the bounding box of the evaluation mask, if supported by the metric
+        roi_context = context.get_roi_context(self)
+        return MetricResult(self.get_score_from_context(roi_context),
+                            lambda: roi_context.get_full_frame(self.get_visualization_from_context(
+                                roi_context)))
+
+    def get_result_from_context(self, context):
+        return MetricResult(self.get_score_from_context(context),
+                            lambda: self.get_visualization_from_context(context))
+
+    def get_additional_results(self, context):
+        # further results which are saved along with the score, e.g. scores per image region
+        return dict()
+
+    def get_additional_results_from_sums(self, sums):
+        # additional results of the tiled evaluation, from the sums of all stripes
+        return dict()
+
     def get_evaluation_mask(self, scene, ignore_boundary=True):
+        return self.get_packed_evaluation_mask(scene, ignore_boundary).to_bool()
+
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
         # default mask: everything except for image boundary
-        return scene.get_boundary_mask(ignore_boundary)
+        return scene.get_packed_boundary_mask(ignore_boundary)
 
     def evaluate_on_high_resolution(self):
         return self.eval_on_high_res
@@ -117,8 +167,7 @@ class BaseMetric(object):
         # general metrics don't require a mask file with a specific region
         if self.mask_name is None:
             return True
-        fname = op.join(scene.data_path, "%s_%s.png" % (self.mask_name, resolution))
-        return op.isfile(fname)
+        return scene.has_data(self.mask_name, resolution)
 
     def pixelize_results(self):
         return self.get_id().startswith(("mse", "badpix", "q"))
@@ -128,6 +177,9 @@ class BadPix(BaseMetric):
     def __init__(self, thresh=settings.BAD_PIX_THRESH, name="BadPix", **kwargs):
         super(BadPix, self).__init__(name=name, **kwargs)
         self.thresh = thresh
+        self.roi_halo = 0
+        self.tiling = "sums"
+        self.intermediates = ("abs_diff", "sorted_abs_diffs", "evaluation_mask")
         self.cmin = 0
         self.cmax = 1
 
@@ -150,18 +202,28 @@ class BadPix(BaseMetric):
     def get_legend(self):
         return "green = good, red = bad"
 
-    def get_score(self, algo_result, gt, scene, with_visualization=False):
-        m_bad_pix = self.get_bad_pix(algo_result - gt)
-        mask = self.get_evaluation_mask(scene) * misc.get_mask_valid(m_bad_pix)
-        n_bad = np.sum(m_bad_pix[mask])
-        score = misc.percentage(np.sum(mask), n_bad)
+    def get_score_from_context(self, context):
+        return self.get_scores_from_context(context, [self.thresh])[0]
 
-        if not with_visualization:
-            return score
+    def get_visualization_from_context(self, context):
+        m_bad_pix = plotting.adjust_binary_vis(self.get_bad_pix_from_context(context))
+        return np.ma.masked_array(m_bad_pix, mask=~context.get_evaluation_mask(self))
+
+    def get_score_sums_from_context(self, context):
+        # number of pixels and bad pixels within the evaluation mask
+        mask = context.get_evaluation_mask(self)
+        n_bad = masked_reductions.get_count_in_mask(self.get_bad_pix_from_context(context), mask,
+                                                    out=context.get_buffer("bad_pix"))
+        return np.asarray([masked_reductions.get_count(mask), n_bad])
 
-        m_bad_pix = plotting.adjust_binary_vis(m_bad_pix)
-        vis = np.ma.masked_array(m_bad_pix, mask=~mask)
-        return score, vis
+    def get_score_from_sums(self, sums):
+        return misc.percentage(sums[0], sums[1])
+
+    def get_bad_pix_from_context(self, context):
+        # NaN is never bad, infinite errors are
+        m_bad_pix = context.get_buffer("bad_pix")
+        with np.errstate(invalid="ignore"):
+            return np.greater(context.get_abs_diff(), self.thresh, out=m_bad_pix)
 
     def get_bad_pix(self, diffs):
         with np.errstate(invalid="ignore"):
@@ -173,7 +235,37 @@ class BadPix(BaseMetric):
             return np.nan
 
         m_bad_pix = self.get_bad_pix(diffs)
-        return misc.percentage(np.size(diffs), np.sum(m_bad_pix))
+        return misc.percentage(np.size(diffs), masked_reductions.get_count(m_bad_pix))
+
+    def get_scores_from_context(self, context, thresholds):
+        # the sorted errors are shared by all metrics with the same evaluation mask
+        sorted_diffs = context.get_sorted_abs_diffs(self)
+        n_pixels = masked_reductions.get_count(context.get_evaluation_mask(self))
+        return self.get_scores_from_sorted_diffs(sorted_diffs, n_pixels, thresholds)
+
+    @staticmethod
+    def get_scores_from_diffs(diffs, thresholds):
+        if np.size(diffs) == 0:
+            return np.full(np.shape(thresholds), fill_value=np.nan)
+
+        abs_diffs = np.abs(np.ravel(diffs))
+        mask = masked_reductions.get_mask_not_nan(abs_diffs)
+        sorted_diffs = masked_reductions.get_selection(abs_diffs, mask)
+        sorted_diffs.sort()
+        return BadPix.get_scores_from_sorted_diffs(sorted_diffs, np.size(diffs), thresholds)
+
+    @staticmethod
+    def get_scores_from_sorted_diffs(sorted_diffs, n_pixels, thresholds):
+        # one binary search per threshold instead of one pass over all pixels,
+        # NaN pixels count towards n_pixels but never as bad pixels, infinite errors are bad
+        if n_pixels == 0:
+            return np.full(np.shape(thresholds), fill_value=np.nan)
+
+        # compare in the precision of the errors, as the scalar comparison would
+        thresholds = np.asarray(thresholds, dtype=sorted_diffs.dtype)
+        n_good = np.searchsorted(sorted_diffs, thresholds, side="right")
+        n_bad = np.size(sorted_diffs) - n_good
+        return misc.percentage(n_pixels, n_bad)
 
     @staticmethod
     def format_score(score):
@@ -186,6 +278,9 @@ class MSE(BaseMetric):
         super(MSE, self).__init__(name=name, vmin=vmin, vmax=vmax,
                                   cmap=cmap, colorbar_bins=colorbar_bins, **kwargs)
         self.factor = factor
+        self.roi_halo = 0
+        self.tiling = "sums"
+        self.intermediates = ("diff", "mask_valid_inputs", "evaluation_mask")
 
     def get_id(self):
         return "mse_%d" % self.factor
@@ -197,31 +292,49 @@ class MSE(BaseMetric):
     def get_legend(self):
         return "white = correct, red = too far, blue = too close"
 
-    def get_score(self, algo_result, gt, scene, with_visualization=False):
-        mask = self.get_evaluation_mask(scene) * \
-               misc.get_mask_valid(algo_result) * \
-               misc.get_mask_valid(gt)
-        score = self.get_masked_score(algo_result, gt, mask)
+    def get_score_from_context(self, context):
+        return self.get_score_from_sums(self.get_squared_diff_sums_from_context(context))
 
-        if not with_visualization:
-            return score
+    def get_visualization_from_context(self, context):
+        mask = context.get_evaluation_mask(self) * context.get_mask_valid_inputs()
+        # gt - algo_result
+        return np.ma.masked_array(-context.get_diff(), mask=~mask)
+
+    def get_score_sums_from_context(self, context):
+        return self.get_squared_diff_sums_from_context(context)
 
-        vis = np.ma.masked_array(gt - algo_result, mask=~mask)
-        return score, vis
+    def get_squared_diff_sums_from_context(self, context):
+        # sum of squared differences and number of valid pixels within the evaluation mask
+        masks = [context.get_evaluation_mask(self), context.get_mask_valid_inputs()]
+        mask = masked_reductions.get_mask(masks, out=context.get_buffer("mask"))
+        diff = context.get_diff()
+        squared_diff = context.get_buffer("values", diff.dtype)
+        sum_of_squares = masked_reductions.get_sum_of_squares(diff, mask, out=squared_diff)
+        return np.asarray([sum_of_squares, masked_reductions.get_count(mask)])
+
+    def get_score_from_sums(self, sums):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sums[0] / sums[1] * self.factor
 
     def get_masked_score(self, algo_result, gt, mask):
         with np.errstate(invalid="ignore"):
-            diff = np.square(gt - algo_result)
-        return np.average(diff[mask]) * self.factor
+            diff = misc.apply_upsampled(np.subtract, algo_result, gt)
+        # accumulate in double precision independent of the input type
+        return masked_reductions.get_mean_of_squares(diff, mask) * self.factor
 
 
 class Quantile(BaseMetric):
     def __init__(self, percentage, factor=100, name="Quantile", vmin=0, vmax=0.5,
-                 cmap=settings.CMAP_QUANTILE, colorbar_bins=5, **kwargs):
+                 cmap=settings.CMAP_QUANTILE, colorbar_bins=5, profile=None, **kwargs):
         super(Quantile, self).__init__(name=name, vmin=vmin, vmax=vmax,
                                        cmap=cmap, colorbar_bins=colorbar_bins, **kwargs)
         self.percentage = percentage
         self.factor = factor
+        # all percentages of the profile are selected together and shared via the context
+        self.profile = tuple(sorted(set(profile or []) | {percentage}))
+        self.roi_halo = 0
+        self.tiling = "selection"
+        self.intermediates = ("abs_diff", "mask_valid_diff", "quantiles", "evaluation_mask")
         self.cmin = 0
         self.cmax = vmax
 
@@ -240,22 +353,59 @@ class Quantile(BaseMetric):
         return "gray = errors above %dth percentile, " \
                "white/yellow = good, red = relatively bad" % self.percentage
 
-    def get_score(self, algo_result, gt, scene, with_visualization=False):
-        diffs = np.abs(algo_result - gt) * self.factor
-        mask = self.get_evaluation_mask(scene) * misc.get_mask_valid(diffs) * misc.get_mask_valid(algo_result)
-        sorted_diffs = np.sort(diffs[mask])
-        idx = np.size(sorted_diffs) * self.percentage / 100.
-        score = sorted_diffs[int(idx)]
-
-        if not with_visualization:
-            return score
+    def get_score_from_context(self, context):
+        scores = self.get_scores_from_context(context)
+        return scores[self.profile.index(self.percentage)]
 
+    def get_visualization_from_context(self, context):
+        # the score is shared with the score computation through the quantiles of the context
+        score = self.get_score_from_context(context)
+        vis = context.get_abs_diff() * self.factor
+        # valid diffs imply a valid algorithm result
+        mask = context.get_evaluation_mask(self) * context.get_mask_valid_diff()
         with np.errstate(invalid="ignore"):
-            m_bad_pix = np.abs(diffs) > score
-        vis = np.abs(diffs)
-        vis[m_bad_pix] = -1
-        vis = np.ma.masked_array(vis, mask=~mask)
-        return score, vis
+            vis[vis > score] = -1
+        return np.ma.masked_array(vis, mask=~mask)
+
+    def get_scores_from_context(self, context):
+        # scores for all percentages of the profile, in ascending order
+        key = ("quantiles", type(self), self.mask_name, self.profile)
+        return context.get_intermediate(key, lambda: self.get_scores_from_selection(
+            self.get_selection_from_context(context), self.profile) * self.factor)
+
+    def get_selection_from_context(self, context):
+        mask = masked_reductions.get_mask([context.get_evaluation_mask(self), context.get_mask_valid_diff()],
+                                          out=context.get_buffer("mask"))
+        return masked_reductions.get_selection(context.get_abs_diff(), mask)
+
+    def get_ranks(self, n_values):
+        if n_values == 0:
+            return []
+        return [Quantile.get_rank(n_values, self.percentage)]
+
+    @staticmethod
+    def get_rank(n_values, percentage):
+        # the 100th percentile is the maximum
+        return min(int(n_values * percentage / 100.), n_values - 1)
+
+    def get_score_from_order_statistics(self, values):
+        if np.size(values) == 0:
+            return np.nan
+        return (values * self.factor)[0]
+
+    @staticmethod
+    def get_scores_from_diffs(diffs, percentages):
+        return Quantile.get_scores_from_selection(np.abs(np.ravel(diffs)), percentages)
+
+    @staticmethod
+    def get_scores_from_selection(abs_diffs, percentages):
+        # one linear time selection for all order statistics instead of a full sort,
+        # the absolute differences are partitioned in place
+        if np.size(abs_diffs) == 0:
+            return np.full(np.shape(percentages), fill_value=np.nan)
+
+        indices = [Quantile.get_rank(np.size(abs_diffs), p) for p in percentages]
+        return masked_reductions.get_order_statistics(abs_diffs, indices)
 
     @staticmethod
     def format_score(score):
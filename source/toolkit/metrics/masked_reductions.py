@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+import numpy as np
+
+
+# reductions of values within a boolean mask, which work on the full arrays instead of
+# compacting the selected values with boolean indexing. intermediate arrays are written
+# to preallocated buffers, e.g. the scratch buffers of an evaluation context, out=None
+# allocates a new array instead.
+
+
+def get_mask(masks, out=None):
+    # logical and of all masks
+    if out is None:
+        out = np.empty(np.shape(masks[0]), dtype=np.bool)
+    np.copyto(out, masks[0])
+    for mask in masks[1:]:
+        np.logical_and(out, mask, out=out)
+    return out
+
+
+def get_mask_valid(values, masks=(), out=None):
+    # finite values within all masks
+    out = np.isfinite(values, out=out)
+    for mask in masks:
+        np.logical_and(out, mask, out=out)
+    return out
+
+
+def get_mask_not_nan(values, masks=(), out=None):
+    # values other than NaN within all masks, infinite values are kept
+    out = np.isnan(values, out=out)
+    np.logical_not(out, out=out)
+    for mask in masks:
+        np.logical_and(out, mask, out=out)
+    return out
+
+
+def get_count(mask):
+    return np.count_nonzero(mask)
+
+
+def get_count_in_mask(m_values, mask, out=None):
+    # number of true values within the mask, out may be m_values itself
+    return np.count_nonzero(np.logical_and(m_values, mask, out=out))
+
+
+def get_count_above(values, thresh, mask, out=None):
+    # number of values > thresh within the mask, NaN is never above the threshold
+    with np.errstate(invalid="ignore"):
+        m_above = np.greater(values, thresh, out=out)
+    return get_count_in_mask(m_above, mask, out=m_above)
+
+
+def get_masked(values, mask, out=None):
+    # values within the mask, zero elsewhere
+    if out is None:
+        out = np.zeros(np.shape(values), dtype=values.dtype)
+    else:
+        out.fill(0)
+    np.copyto(out, values, where=mask)
+    return out
+
+
+def get_sum(values, mask, out=None):
+    # accumulated in double precision independent of the type of the values
+    return np.sum(get_masked(values, mask, out=out), dtype=np.float64)
+
+
+def get_masked_squares(values, mask, out=None):
+    # squared values within the mask, zero elsewhere
+    if out is None:
+        out = np.zeros(np.shape(values), dtype=values.dtype)
+    else:
+        out.fill(0)
+    with np.errstate(invalid="ignore"):
+        np.square(values, out=out, where=mask)
+    return out
+
+
+def get_sum_of_squares(values, mask, out=None):
+    return np.sum(get_masked_squares(values, mask, out=out), dtype=np.float64)
+
+
+def get_mean_of_squares(values, mask, out=None):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return get_sum_of_squares(values, mask, out=out) / np.float64(get_count(mask))
+
+
+def get_selection(values, mask):
+    # order statistics require the selected values, this is the only copy,
+    # which may then be partitioned or sorted in place
+    return values[mask]
+
+
+def get_order_statistics(selection, ranks):
+    # values at the given ranks of the ascending order, the selection is partitioned in place
+    selection.partition(sorted(set(ranks)))
+    return selection[ranks]
+
+
+def get_median(selection):
+    # as np.median, the selection is partitioned in place
+    return np.median(selection, overwrite_input=True)
@@ -31,11 +31,15 @@
 
 
 import numpy as np
-import skimage.filters as skf
+import scipy.ndimage as ndimage
 
 from toolkit import settings
-from toolkit.metrics import BadPix, BaseMetric
-from toolkit.utils import misc, plotting
+from toolkit.metrics import BadPix, BaseMetric, masked_reductions
+from toolkit.utils import misc
+
+
+SCHARR_H = np.asarray([[3., 10., 3.], [0., 0., 0.], [-3., -10., -3.]]) / 16.
+SCHARR_V = np.transpose(SCHARR_H)
 
 
 class Discontinuities(BadPix):
@@ -56,8 +60,8 @@ class Discontinuities(BadPix):
     def get_short_name(self):
         return "Discont."
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_mask(self.mask_name) * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(self.mask_name) & scene.get_packed_boundary_mask(ignore_boundary)
 
 
 class BumpinessPlanes(BaseMetric):
@@ -70,6 +74,10 @@ class BumpinessPlanes(BaseMetric):
         self.factor = factor
         self.category = settings.PHOTOREALISTIC_METRIC
         self.mask_name = "mask_planes"
+        # two 3x3 filter passes
+        self.roi_halo = 2
+        self.tiling = "sums"
+        self.intermediates = ("hessian_norm", "evaluation_mask")
 
     def get_id(self):
         return ("bumpiness_planes_%d_%0.3f" % (self.factor, self.clip)).replace(".", "")
@@ -84,32 +92,66 @@ class BumpinessPlanes(BaseMetric):
     def get_short_name(self):
         return "Planes"
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_mask(self.mask_name) * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(self.mask_name) & scene.get_packed_boundary_mask(ignore_boundary)
+
+    def get_score_from_context(self, context):
+        return self.get_score_from_sums(self.get_score_sums_from_context(context))
+
+    def get_visualization_from_context(self, context):
+        bumpiness, mask = self.get_bumpiness_from_context(context)
+        return np.ma.masked_array(bumpiness * self.factor, mask=~mask)
+
+    def get_score_sums_from_context(self, context):
+        bumpiness, mask = self.get_bumpiness_from_context(context)
+        # accumulated in double precision without a copy of the selected values,
+        # the sum agrees with np.sum(bumpiness[mask]) to within rounding
+        values = context.get_buffer("values", bumpiness.dtype)
+        sum_of_bumpiness = masked_reductions.get_sum(bumpiness, mask, out=values)
+        return np.asarray([sum_of_bumpiness, masked_reductions.get_count(mask)])
+
+    def get_score_from_sums(self, sums):
+        return self.factor * sums[0] / float(sums[1])
+
+    def get_bumpiness_from_context(self, context):
+        # the Hessian norm is shared by all bumpiness metrics, the clip depends on the metric
+        hessian_norm = context.get_filtered_intermediate(
+            "hessian_norm", lambda filter_context: self.get_hessian_norm(filter_context.get_diff()))
+        bumpiness = context.get_buffer("bumpiness", hessian_norm.dtype)
+        np.clip(hessian_norm, 0, self.clip, out=bumpiness)
+        mask = masked_reductions.get_mask_valid(bumpiness, [context.get_evaluation_mask(self)],
+                                                out=context.get_buffer("mask"))
+        return bumpiness, mask
 
-    def get_score(self, algo_result, gt, scene, with_visualization=False):
-        bumpiness = self.get_bumpiness(gt, algo_result)
-        mask = self.get_evaluation_mask(scene) * misc.get_mask_valid(bumpiness)
-        score = self.factor * np.sum(bumpiness[mask]) / float(np.sum(mask))
+    def get_bumpiness(self, gt, algo_result):
+        return self.get_bumpiness_from_diff(misc.apply_upsampled(np.subtract, algo_result, gt))
 
-        if not with_visualization:
-            return score
+    def get_bumpiness_from_diff(self, diff):
+        return np.clip(self.get_hessian_norm(diff), 0, self.clip)
 
-        vis = np.ma.masked_array(bumpiness * self.factor, mask=~mask)
-        return score, vis
+    @staticmethod
+    def get_hessian_norm(diff):
+        # Frobenius norm of the Hesse matrix, based on Scharr derivatives
+        diff = np.asarray(diff, dtype=misc.get_float_dtype())
+        second_derivative = np.empty_like(diff)
 
-    def get_bumpiness(self, gt, algo_result):
-        # Frobenius norm of the Hesse matrix
-        diff = np.asarray(algo_result - gt, dtype='float64')
-        dx = skf.scharr_v(diff)
-        dy = skf.scharr_h(diff)
-        dxx = skf.scharr_v(dx)
-        dxy = skf.scharr_h(dx)
-        dyy = skf.scharr_h(dy)
-        dyx = skf.scharr_v(dy)
-        bumpiness = np.sqrt(np.square(dxx) + np.square(dxy) + np.square(dyy) + np.square(dyx))
-        bumpiness = np.clip(bumpiness, 0, self.clip)
-        return bumpiness
+        def scharr(data, weights, output):
+            # same as skimage.filters.scharr_h/v but without the float64 copy
+            ndimage.convolve(data, weights, output=output, mode="reflect")
+            output[[0, -1], :] = 0
+            output[:, [0, -1]] = 0
+            return output
+
+        dx = scharr(diff, SCHARR_V, np.empty_like(diff))
+        dy = scharr(diff, SCHARR_H, np.empty_like(diff))
+
+        # accumulate squared second derivatives in place: dxx, dxy, dyy, dyx
+        hessian_norm = np.square(scharr(dx, SCHARR_V, np.empty_like(diff)))
+        for data, weights in [(dx, SCHARR_H), (dy, SCHARR_H), (dy, SCHARR_V)]:
+            scharr(data, weights, second_derivative)
+            hessian_norm += np.square(second_derivative, out=second_derivative)
+
+        return np.sqrt(hessian_norm, out=hessian_norm)
 
 
 class BumpinessContinSurf(BumpinessPlanes):
@@ -139,6 +181,11 @@ class MAEPlanes(BaseMetric):
                                         colorbar_bins=5, cmap=settings.CMAP_ABS_ERROR)
         self.category = settings.PHOTOREALISTIC_METRIC
         self.mask_name = "mask_planes"
+        # one 3x3 filter pass with periodic boundary
+        self.roi_halo = 1
+        self.roi_periodic = True
+        self.tiling = "selection"
+        self.intermediates = ("angular_error", "evaluation_mask")
 
     def get_description(self):
         return "The median angular error of the surface normals at the given plane regions."
@@ -152,18 +199,52 @@ class MAEPlanes(BaseMetric):
     def get_id(self):
         return "mae_planes"
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_mask(self.mask_name) * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(self.mask_name) & scene.get_packed_boundary_mask(ignore_boundary)
+
+    def get_score_from_context(self, context):
+        return masked_reductions.get_median(self.get_selection_from_context(context))
 
-    def get_score(self, algo_result, gt, scene, with_visualization=False):
-        mask = self.get_evaluation_mask(scene)
-        return self.get_score_from_mask(algo_result, gt, scene, mask,
-                                        with_visualization=with_visualization)
+    def get_visualization_from_context(self, context):
+        angular_error = self.get_shared_angular_error(context)
+        mask = context.get_evaluation_mask(self) * misc.get_mask_valid(context.algo_result) * \
+            misc.get_mask_valid(angular_error)
+        return np.ma.masked_array(angular_error, mask=~mask)
+
+    def get_shared_angular_error(self, context):
+        # angular errors are shared by all normal metrics
+        return context.get_filtered_intermediate("angular_error", self.get_angular_error_from_context)
+
+    def get_selection_from_context(self, context):
+        angular_error = self.get_shared_angular_error(context)
+        mask_valid = masked_reductions.get_mask_valid(
+            context.algo_result, out=context.get_buffer("valid", shape=np.shape(context.algo_result)))
+        masks = [context.get_evaluation_mask(self), mask_valid]
+        mask = masked_reductions.get_mask_valid(angular_error, masks, out=context.get_buffer("mask"))
+        return masked_reductions.get_selection(angular_error, mask)
+
+    @staticmethod
+    def get_ranks(n_values):
+        # np.median averages the two middle values of an even number of values
+        if n_values == 0:
+            return []
+        return sorted({(n_values - 1) // 2, n_values // 2})
+
+    @staticmethod
+    def get_score_from_order_statistics(values):
+        if np.size(values) == 0:
+            return np.nan
+        return np.mean(values)
 
     def get_score_from_mask(self, algo_result, gt, scene, mask, with_visualization=False):
         angular_error = self.get_angular_error(algo_result, gt, scene)
-        mask = mask * misc.get_mask_valid(algo_result) * misc.get_mask_valid(angular_error)
-        score = np.median(angular_error[mask])
+        return self.get_score_from_angular_error(algo_result, angular_error, mask,
+                                                 with_visualization=with_visualization)
+
+    def get_score_from_angular_error(self, algo_result, angular_error, mask, with_visualization=False):
+        mask = masked_reductions.get_mask_valid(angular_error, [mask, misc.get_mask_valid(algo_result)])
+        # np.median selects the middle elements with a partition instead of a full sort
+        score = masked_reductions.get_median(masked_reductions.get_selection(angular_error, mask))
 
         if not with_visualization:
             return score
@@ -171,11 +252,26 @@ class MAEPlanes(BaseMetric):
         vis = np.ma.masked_array(angular_error, mask=~mask)
         return score, vis
 
+    def get_angular_error_from_context(self, context):
+        scene = context.scene
+        algo_normals = scene.get_depth_normals(scene.disp2depth(context.algo_result), roi=context.roi)
+        if context.is_scene_gt:
+            gt_normals = context.crop(scene.get_gt_normals(context.frame_gt))
+        else:
+            gt_normals = scene.get_depth_normals(scene.disp2depth(context.gt), roi=context.roi)
+        return self.get_angular_error_from_normals(algo_normals, gt_normals)
+
     @staticmethod
     def get_angular_error(algo_result, gt, scene):
         algo_normals = scene.get_depth_normals(scene.disp2depth(algo_result))
-        gt_normals = scene.get_depth_normals(scene.disp2depth(gt))
+        if scene.is_gt(gt):
+            gt_normals = scene.get_gt_normals(gt)
+        else:
+            gt_normals = scene.get_depth_normals(scene.disp2depth(gt))
+        return MAEPlanes.get_angular_error_from_normals(algo_normals, gt_normals)
 
+    @staticmethod
+    def get_angular_error_from_normals(algo_normals, gt_normals):
         ssum = np.sum(algo_normals * gt_normals, axis=2)
         ssum = np.clip(ssum, -1., 1.)
         angular_error = np.degrees(np.arccos(ssum))
@@ -206,6 +302,7 @@ class FineFattening(BadPix):
                                             eval_on_high_res=eval_on_high_res, **kwargs)
         self.category = settings.PHOTOREALISTIC_METRIC
         self.mask_name = "mask_fine_surrounding"
+        self.intermediates = ("diff", "evaluation_mask")
 
     def get_id(self):
         return ("fine_fattening_%0.3f" % abs(self.thresh)).replace(".", "")
@@ -217,24 +314,21 @@ class FineFattening(BadPix):
         return "The percentage of pixels around fine structures " \
                "with (gt - algo) < %0.2f." % self.thresh
 
-    def get_score(self, algo_result, gt, scene, with_visualization=False):
-        m_fattening = self.get_fattening(algo_result, gt)
-        mask = self.get_evaluation_mask(scene) * misc.get_mask_valid(m_fattening)
-        score = misc.percentage(np.sum(mask), np.sum(m_fattening * mask))
-
-        if not with_visualization:
-            return score
+    def get_score_from_context(self, context):
+        return self.get_score_from_sums(self.get_score_sums_from_context(context))
 
-        vis = np.ma.masked_array(plotting.adjust_binary_vis(m_fattening), mask=~mask)
-        return score, vis
+    def get_bad_pix_from_context(self, context):
+        # (gt - algo_result) < thresh
+        with np.errstate(invalid="ignore"):
+            return np.greater(context.get_diff(), -self.thresh, out=context.get_buffer("bad_pix"))
 
     def get_fattening(self, algo_result, gt):
         with np.errstate(invalid="ignore"):
-            m_fattening = (gt - algo_result) < self.thresh
+            m_fattening = misc.apply_upsampled(lambda a, g: (g - a) < self.thresh, algo_result, gt)
         return m_fattening
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_mask(self.mask_name) * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(self.mask_name) & scene.get_packed_boundary_mask(ignore_boundary)
 
 
 class FineThinning(BadPix):
@@ -243,6 +337,7 @@ class FineThinning(BadPix):
                                            eval_on_high_res=eval_on_high_res, **kwargs)
         self.category = settings.PHOTOREALISTIC_METRIC
         self.mask_name = "mask_fine"
+        self.intermediates = ("diff", "evaluation_mask")
 
     def get_id(self):
         return ("fine_thinning_%0.3f" % self.thresh).replace(".", "")
@@ -254,21 +349,18 @@ class FineThinning(BadPix):
         return "The percentage of pixels at fine structures " \
                "with (gt - algo) > %0.2f." % self.thresh
 
-    def get_score(self, algo_result, gt, scene, with_visualization=False):
-        m_thinning = self.get_thinning(algo_result, gt)
-        mask = self.get_evaluation_mask(scene) * misc.get_mask_valid(m_thinning)
-        score = misc.percentage(np.sum(mask), np.sum(m_thinning * mask))
+    def get_score_from_context(self, context):
+        return self.get_score_from_sums(self.get_score_sums_from_context(context))
 
-        if not with_visualization:
-            return score
-
-        vis = np.ma.masked_array(plotting.adjust_binary_vis(m_thinning), mask=~mask)
-        return score, vis
+    def get_bad_pix_from_context(self, context):
+        # (gt - algo_result) > thresh
+        with np.errstate(invalid="ignore"):
+            return np.less(context.get_diff(), -self.thresh, out=context.get_buffer("bad_pix"))
 
     def get_thinning(self, algo_result, gt):
         with np.errstate(invalid="ignore"):
-            mask_thinning = (gt - algo_result) > self.thresh
+            mask_thinning = misc.apply_upsampled(lambda a, g: (g - a) > self.thresh, algo_result, gt)
         return mask_thinning
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_mask(self.mask_name) * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(self.mask_name) & scene.get_packed_boundary_mask(ignore_boundary)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+import numpy as np
+
+from toolkit.metrics import EvaluationContext, BadPix, MSE, Quantile
+from toolkit.utils import misc
+
+
+# metrics which are computed for all algorithms of a stack at once
+STACKED_METRICS = (BadPix, MSE, Quantile)
+
+
+def get_stacked_scores_for_algorithms(algorithms, scene, metrics):
+    # algorithm results are loaded at the current gt_scale of the scene and keep
+    # their precision, as for the evaluation of a single algorithm
+    algo_results = np.dstack([misc.get_algo_result(algorithm, scene) for algorithm in algorithms])
+    return get_stacked_scores(algo_results, scene.get_gt(), scene, metrics)
+
+
+def get_stacked_scores(algo_results, gt, scene, metrics):
+    """
+    Scores for a stack of algorithm results with shape (h, w, n_algorithms)
+    at the resolution of the ground truth. Returns a matrix with shape (n_metrics, n_algorithms).
+
+    MSE, BadPix and Quantile metrics are computed for all algorithms in vectorized passes
+    which share the ground truth and the evaluation masks. Other metrics are evaluated per algorithm.
+    """
+    algo_results = np.ma.getdata(algo_results)
+    n_algorithms = np.shape(algo_results)[2]
+    scores = np.full((len(metrics), n_algorithms), fill_value=np.nan)
+
+    # metrics with the same evaluation mask share the masked differences
+    groups = dict()
+    other_metrics = []
+    for idx_m, metric in enumerate(metrics):
+        if type(metric) in STACKED_METRICS:
+            groups.setdefault(metric.mask_name, []).append(idx_m)
+        else:
+            other_metrics.append(idx_m)
+
+    for indices in groups.values():
+        mask = metrics[indices[0]].get_evaluation_mask(scene)
+        group_metrics = [metrics[idx_m] for idx_m in indices]
+        scores[indices, :] = get_stacked_scores_from_diffs(get_masked_diffs(algo_results, gt, mask),
+                                                           group_metrics)
+
+    if other_metrics:
+        for idx_a in range(n_algorithms):
+            context = EvaluationContext(np.ascontiguousarray(algo_results[:, :, idx_a]), gt, scene,
+                                        metrics=[metrics[idx_m] for idx_m in other_metrics])
+            for idx_m in other_metrics:
+                scores[idx_m, idx_a] = metrics[idx_m].get_score_from_roi(context)
+
+    return scores
+
+
+def get_masked_diffs(algo_results, gt, mask):
+    # differences within the mask with one contiguous row per algorithm
+    diffs = np.ascontiguousarray(algo_results[mask].T, dtype=np.result_type(algo_results, gt))
+    diffs -= gt[mask]
+    return diffs
+
+
+def get_stacked_scores_from_diffs(diffs, metrics):
+    """
+    Scores of MSE, BadPix and Quantile metrics for differences with shape (n_algorithms, n_pixels).
+    Invalid differences are treated as by the metrics, i.e. they count towards the
+    pixels of BadPix, where infinite differences are bad and NaN is not, but are
+    ignored by MSE and Quantile.
+    """
+    scores = np.full((len(metrics), np.shape(diffs)[0]), fill_value=np.nan)
+    if np.shape(diffs)[1] == 0:
+        return scores
+
+    mask_valid = misc.get_mask_valid(diffs)
+    n_valid = np.sum(mask_valid, axis=1)
+
+    idx_mse = [idx_m for idx_m, metric in enumerate(metrics) if type(metric) == MSE]
+    idx_bad_pix = [idx_m for idx_m, metric in enumerate(metrics) if type(metric) == BadPix]
+    idx_quantiles = [idx_m for idx_m, metric in enumerate(metrics) if type(metric) == Quantile]
+
+    if idx_mse:
+        mse_scores = get_mse_scores(diffs, mask_valid, n_valid)
+        for idx_m in idx_mse:
+            scores[idx_m, :] = mse_scores * metrics[idx_m].factor
+
+    if not idx_bad_pix and not idx_quantiles:
+        return scores
+
+    # one sort per algorithm for all thresholds and percentages,
+    # finite differences come first, followed by infinite differences and NaN
+    sorted_diffs = np.abs(diffs)
+    sorted_diffs.sort(axis=1)
+
+    if idx_bad_pix:
+        thresholds = [metrics[idx_m].thresh for idx_m in idx_bad_pix]
+        n_not_nan = np.shape(diffs)[1] - np.sum(np.isnan(diffs), axis=1)
+        for idx_a, n in enumerate(n_not_nan):
+            scores[idx_bad_pix, idx_a] = BadPix.get_scores_from_sorted_diffs(
+                sorted_diffs[idx_a, :n], np.shape(diffs)[1], thresholds)
+
+    rows = np.arange(np.shape(diffs)[0])
+    for idx_m in idx_quantiles:
+        metric = metrics[idx_m]
+        # the 100th percentile is the maximum
+        indices = np.minimum((n_valid * metric.percentage / 100.).astype(np.int), np.maximum(n_valid - 1, 0))
+        scores[idx_m, :] = sorted_diffs[rows, indices] * metric.factor
+        scores[idx_m, n_valid == 0] = np.nan
+
+    return scores
+
+
+def get_mse_scores(diffs, mask_valid, n_valid):
+    # mean squared difference per algorithm, accumulated in double precision
+    with np.errstate(invalid="ignore"):
+        squared_diffs = np.square(diffs)
+    squared_diffs[~mask_valid] = 0
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.sum(squared_diffs, axis=1, dtype=np.float64) / n_valid
@@ -33,7 +33,7 @@
 import numpy as np
 
 from toolkit import settings
-from toolkit.metrics import BadPix, MSE, BumpinessPlanes
+from toolkit.metrics import BadPix, MSE, BumpinessPlanes, masked_reductions
 from toolkit.utils import misc, plotting
 
 
@@ -65,6 +65,8 @@ class BackgammonFattening(StratifiedBadPix):
         super(BackgammonFattening, self).__init__(thresh=thresh, eval_on_high_res=eval_on_high_res,
                                                   name=name, vmin=vmin, vmax=vmax,
                                                   scene_display_name="Backgammon", **kwargs)
+        # the extrapolations are scene data, shared by all algorithms through the data cache
+        self.intermediates = ("evaluation_mask",)
 
     def get_id(self):
         return ("backgammon_fattening_%0.3f" % self.thresh).replace(".", "")
@@ -76,25 +78,21 @@ class BackgammonFattening(StratifiedBadPix):
     def get_short_name(self):
         return "Fattening"
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_fg_fattening_mask() * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(scene.mn_fg_fat) & scene.get_packed_boundary_mask(ignore_boundary)
 
-    def get_score(self, algo_result, gt, scene, with_visualization=False):
-        m_fattening = self.get_fattening(algo_result, gt, scene.get_fg_extrapolation())
-        mask = self.get_evaluation_mask(scene) * misc.get_mask_valid(m_fattening)
-        score = misc.percentage(np.sum(mask), np.sum(m_fattening * mask))
+    def get_score_from_context(self, context):
+        return self.get_score_from_sums(self.get_score_sums_from_context(context))
 
-        if not with_visualization:
-            return score
-
-        vis = np.ma.masked_array(plotting.adjust_binary_vis(m_fattening), mask=~mask)
-        return score, vis
+    def get_bad_pix_from_context(self, context):
+        extrapolation = context.crop(context.scene.get_fg_extrapolation())
+        return self.get_fattening(context.algo_result, context.gt, extrapolation)
 
     @staticmethod
     def get_fattening(algo_result, gt, extrapolated_foreground):
         half_distance = 0.5 * (extrapolated_foreground + gt)  # GT + 0.5 * (FG - GT)
         with np.errstate(invalid="ignore"):
-            m_fattening = (algo_result > half_distance)
+            m_fattening = misc.apply_upsampled(np.greater, algo_result, half_distance)
         return m_fattening
 
 
@@ -104,6 +102,7 @@ class BackgammonThinning(StratifiedBadPix):
         super(BackgammonThinning, self).__init__(thresh=thresh, eval_on_high_res=eval_on_high_res,
                                                  name=name, vmin=vmin, vmax=vmax,
                                                  scene_display_name="Backgammon", **kwargs)
+        self.intermediates = ("evaluation_mask",)
 
     def get_id(self):
         return ("backgammon_thinning_%0.3f" % self.thresh).replace(".", "")
@@ -115,26 +114,21 @@ class BackgammonThinning(StratifiedBadPix):
     def get_short_name(self):
         return "Thinning"
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_fg_thinning_mask() * scene.get_boundary_mask(ignore_boundary)
-
-    def get_score(self, algo_result, gt, scene, with_visualization=False):
-        m_thinning = self.get_thinning(algo_result, gt, scene.get_bg_extrapolation())
-        mask = self.get_evaluation_mask(scene) * misc.get_mask_valid(m_thinning)
-        score = misc.percentage(np.sum(mask), np.sum(m_thinning * mask))
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(scene.mn_fg_thin) & scene.get_packed_boundary_mask(ignore_boundary)
 
-        if not with_visualization:
-            return score
+    def get_score_from_context(self, context):
+        return self.get_score_from_sums(self.get_score_sums_from_context(context))
 
-        m_thinning = plotting.adjust_binary_vis(m_thinning)
-        vis = np.ma.masked_array(m_thinning, mask=~mask)
-        return score, vis
+    def get_bad_pix_from_context(self, context):
+        extrapolation = context.crop(context.scene.get_bg_extrapolation())
+        return self.get_thinning(context.algo_result, context.gt, extrapolation)
 
     @staticmethod
     def get_thinning(algo_result, gt, extrapolated_background):
         half_distance = 0.5 * (extrapolated_background + gt)  # GT - 0.5 * (GT - BG)
         with np.errstate(invalid="ignore"):
-            m_thinning = (algo_result < half_distance)
+            m_thinning = misc.apply_upsampled(np.less, algo_result, half_distance)
         return m_thinning
 
 # --------------------------------------
@@ -171,8 +165,8 @@ class PyramidsSlantedBumpiness(PyramidsBaseBumpiness):
     def get_id(self):
         return ("bumpiness_slanted_%d_%0.3f" % (self.factor, self.clip)).replace(".", "")
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_objects() * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_objects() & scene.get_packed_boundary_mask(ignore_boundary)
 
 
 class PyramidsParallelBumpiness(PyramidsBaseBumpiness):
@@ -186,8 +180,8 @@ class PyramidsParallelBumpiness(PyramidsBaseBumpiness):
     def get_id(self):
         return ("bumpiness_parallel_%d_%0.3f" % (self.factor, self.clip)).replace(".", "")
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_plane_mask() * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(scene.mn_plane) & scene.get_packed_boundary_mask(ignore_boundary)
 
 
 # --------------------------------------
@@ -203,6 +197,9 @@ class MissedDots(StratifiedBadPix):
                                          scene_display_name="Dots",
                                          eval_on_high_res=eval_on_high_res, **kwargs)
         self.missed_dot_bad_pix = missed_dot_bad_pix
+        # dots are evaluated with absolute coordinates on the full frame
+        self.roi_halo = None
+        self.intermediates = ("abs_diff",)
 
     def get_id(self):
         return ("missed_dots_%d_%0.3f" % (self.missed_dot_bad_pix, self.thresh)).replace(".", "")
@@ -213,47 +210,39 @@ class MissedDots(StratifiedBadPix):
     def get_short_name(self):
         return "Missed Dots"
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_boundary_mask(ignore_boundary)
-
-    def get_score(self, algo_result, gt, scene, with_visualization=False):
-        grid = scene.get_boxes()
-        dots_by_size = scene.get_dots_by_size()
-        bad_pix = BadPix(thresh=self.thresh)
-
-        vis = np.zeros(np.shape(algo_result), dtype=np.bool)
-        diffs = np.abs(gt - algo_result)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_boundary_mask(ignore_boundary)
 
-        box_ids = sorted(list(np.unique(grid)))
-        box_ids.remove(0)
-        n_boxes = np.size(box_ids)
+    def get_score_from_context(self, context):
+        return self.get_score_from_sums(self.get_score_sums_from_context(context))
 
-        dot_labels = list(np.unique(dots_by_size))
-        # use only the nine biggest dots per box
-        dot_labels = [dl for dl in dot_labels if 0 < dl < 9]
-        n_dots = len(dot_labels)
-        total_dots = n_dots * n_boxes
-        detected_dots = 0
+    def get_visualization_from_context(self, context):
+        m_missed = self.get_missed_dots(self.get_score_sums_from_context(context))
+        labels = context.crop(context.scene.get_dot_labels()[0])
+        return plotting.adjust_binary_vis(np.concatenate(([False], m_missed))[labels])
 
-        for box_id in box_ids:
-            m_box = (grid == box_id)
+    def get_score_sums_from_context(self, context):
+        # pixels and bad pixels per dot in a single pass over the image, label 0 is the background
+        labels, n_pixels = context.scene.get_dot_labels()
+        if context.roi is not None:
+            labels = context.crop(labels)
+            n_pixels = np.bincount(labels.ravel(), minlength=np.size(n_pixels) + 1)[1:]
 
-            for idx_d in range(n_dots):
-                dot_mask = (dots_by_size == idx_d+1) * m_box
-                bad_pix_on_dot = bad_pix.get_score_from_diffs(diffs[dot_mask])
-                if bad_pix_on_dot < self.missed_dot_bad_pix:
-                    detected_dots += 1
-                else:
-                    vis[dot_mask] = 1
-
-        missed_dots = total_dots - detected_dots
-        score = misc.percentage(total_dots, missed_dots)
+        with np.errstate(invalid="ignore"):
+            m_bad_pix = np.greater(context.get_abs_diff(), self.thresh, out=context.get_buffer("bad_pix"))
+        labels_bad_pix = masked_reductions.get_selection(labels, m_bad_pix)
+        n_bad = np.bincount(labels_bad_pix, minlength=np.size(n_pixels) + 1)[1:]
+        return np.concatenate((n_pixels, n_bad))
 
-        if not with_visualization:
-            return score
+    def get_score_from_sums(self, sums):
+        m_missed = self.get_missed_dots(sums)
+        return misc.percentage(np.size(m_missed), np.sum(m_missed))
 
-        vis = plotting.adjust_binary_vis(vis)
-        return score, vis
+    def get_missed_dots(self, sums):
+        # dots without pixels are counted as missed
+        n_pixels, n_bad = np.split(sums, 2)
+        bad_pix_on_dots = misc.percentages(n_pixels, n_bad)
+        return ~(bad_pix_on_dots < self.missed_dot_bad_pix)
 
 
 class DotsBackgroundMSE(MSE):
@@ -275,8 +264,45 @@ class DotsBackgroundMSE(MSE):
     def get_short_name(self):
         return "Background"
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_background_mask() * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(scene.mn_background) & scene.get_packed_boundary_mask(ignore_boundary)
+
+    def get_additional_results(self, context):
+        return {"per_cell": [float(score) for score in self.get_scores_per_cell(context)]}
+
+    def get_additional_results_from_sums(self, sums):
+        return {"per_cell": [float(score) for score in self.get_scores_per_cell_from_sums(sums[2:])]}
+
+    def get_score_sums_from_context(self, context):
+        # the sums per cell are added up as well, for the additional results
+        sums = super(DotsBackgroundMSE, self).get_score_sums_from_context(context)
+        return np.concatenate((sums, self.get_cell_sums_from_context(context)))
+
+    def get_scores_per_cell(self, context):
+        roi_context = context.get_roi_context(self)
+        return self.get_scores_per_cell_from_sums(self.get_cell_sums_from_context(roi_context))
+
+    def get_cell_sums_from_context(self, context):
+        # sums of squared errors and pixel counts per cell in one labeled reduction,
+        # invalid pixels are ignored as for the score on the whole background
+        labels, n_pixels = context.scene.get_cell_labels()
+        mask_valid = context.get_mask_valid_inputs()
+        labels_buffer = context.get_buffer("labels", labels.dtype)
+        labels = masked_reductions.get_masked(context.crop(labels), mask_valid, out=labels_buffer).ravel()
+
+        diff = context.get_diff()
+        squares_buffer = context.get_buffer("values", diff.dtype)
+        squared_diff = masked_reductions.get_masked_squares(diff, mask_valid, out=squares_buffer).ravel()
+
+        n_cells = np.size(n_pixels) + 1
+        sums = np.bincount(labels, weights=squared_diff, minlength=n_cells)[1:]
+        counts = np.bincount(labels, minlength=n_cells)[1:]
+        return np.concatenate((sums, counts))
+
+    def get_scores_per_cell_from_sums(self, cell_sums):
+        sums, counts = np.split(cell_sums, 2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sums / counts * self.factor
 
 
 # --------------------------------------
@@ -294,8 +320,8 @@ class StripesLowTexture(StratifiedBadPix):
     def get_id(self):
         return ("low_texture_%0.3f" % self.thresh).replace(".", "")
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_low_texture() * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(scene.mn_low_texture) & scene.get_packed_boundary_mask(ignore_boundary)
 
     @staticmethod
     def eval_on_high_res():
@@ -312,8 +338,8 @@ class DarkStripes(StratifiedBadPix):
     def get_id(self):
         return ("dark_stripes_%0.3f" % self.thresh).replace(".", "")
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_high_contrast() * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(scene.mn_high_contrast) & scene.get_packed_boundary_mask(ignore_boundary)
 
 
 class BrightStripes(StratifiedBadPix):
@@ -326,5 +352,5 @@ class BrightStripes(StratifiedBadPix):
     def get_id(self):
         return ("bright_stripes_%0.3f" % self.thresh).replace(".", "")
 
-    def get_evaluation_mask(self, scene, ignore_boundary=True):
-        return scene.get_low_contrast() * scene.get_boundary_mask(ignore_boundary)
+    def get_packed_evaluation_mask(self, scene, ignore_boundary=True):
+        return scene.get_packed_mask(scene.mn_low_contrast) & scene.get_packed_boundary_mask(ignore_boundary)
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+import numpy as np
+
+from toolkit.metrics import EvaluationContext, EvaluationPlan
+from toolkit.utils import misc
+
+
+# upper estimate of the number of float arrays with the size of a stripe
+# which are alive at once, e.g. while the surface normals are computed
+N_ARRAYS_PER_STRIPE = 32
+
+# bits of the sortable bit patterns which are resolved per histogram pass
+HISTOGRAM_BITS = 16
+
+
+def get_tiled_scores(algo_result, gt, scene, metrics, max_bytes):
+    """
+    Scores of metrics which support the tiled evaluation, see BaseMetric.tiling.
+    Metrics are evaluated on stripes of full rows, including the halo their filters require,
+    such that intermediate results take about max_bytes, regardless of the resolution.
+    The ground truth, the algorithm result and the scene data are not part of the budget.
+
+    Sums are added up over all stripes. Order statistics, e.g. quantiles and medians,
+    are selected exactly by histogram refinement with further passes over the stripes.
+    Returns a dictionary with metric: (score, additional results).
+    """
+    results = dict()
+
+    # metrics with the same halo share the intermediate results of their stripes
+    tilings = sorted(set(get_tiling(metric) for metric in metrics))
+    for halo, periodic in tilings:
+        group = [metric for metric in metrics if get_tiling(metric) == (halo, periodic)]
+        stripes = get_stripes(algo_result, gt, max_bytes, halo, periodic)
+        results.update(get_tiled_scores_of_group(algo_result, gt, scene, group, stripes, max_bytes))
+
+    return results
+
+
+def get_tiling(metric):
+    # metrics which are evaluated on the full frame are pixel wise
+    return metric.roi_halo or 0, metric.roi_periodic
+
+
+def get_tiled_scores_of_group(algo_result, gt, scene, metrics, stripes, max_bytes):
+    sum_metrics = [metric for metric in metrics if metric.tiling == "sums"]
+    selection_metrics = [metric for metric in metrics if metric.tiling == "selection"]
+
+    max_candidates = max_bytes // (N_ARRAYS_PER_STRIPE * np.dtype(misc.get_float_dtype()).itemsize)
+    all_selections = dict((metric, OrderStatistics(metric.get_ranks, max_candidates))
+                          for metric in selection_metrics)
+    selections = all_selections
+    sums = dict()
+
+    # the first pass computes all sums, further passes refine the order statistics
+    while True:
+        plan = EvaluationPlan(sum_metrics + list(selections.keys()))
+        for roi, core in stripes:
+            context = EvaluationContext(algo_result, gt, scene, roi=roi, core=core)
+            for metric in plan.get_metrics(context):
+                if metric in selections:
+                    selections[metric].add(metric.get_selection_from_context(context))
+                else:
+                    stripe_sums = metric.get_score_sums_from_context(context)
+                    sums[metric] = sums[metric] + stripe_sums if metric in sums else stripe_sums
+
+        for selection in selections.values():
+            selection.finish_pass()
+
+        sum_metrics = []
+        selections = dict((metric, selection) for metric, selection in selections.items()
+                          if not selection.is_done())
+        if not selections:
+            break
+
+    results = dict()
+    for metric, metric_sums in sums.items():
+        results[metric] = (metric.get_score_from_sums(metric_sums),
+                           metric.get_additional_results_from_sums(metric_sums))
+    for metric, selection in all_selections.items():
+        results[metric] = (metric.get_score_from_order_statistics(selection.get_values()), dict())
+    return results
+
+
+def get_stripes(algo_result, gt, max_bytes, halo, periodic):
+    """
+    Returns a list of (roi, core) with the region of interest of each stripe and its core rows.
+    Stripes are aligned to blocks of low resolution pixels. With periodic=True, the halo
+    of the first and the last stripe wraps around the image.
+    """
+    height, width = np.shape(gt)[0:2]
+    factor = height // np.shape(algo_result)[0]
+
+    bytes_per_row = N_ARRAYS_PER_STRIPE * np.dtype(misc.get_float_dtype()).itemsize * width
+    halo += (-halo) % factor
+    n_rows = max_bytes // bytes_per_row - 2 * halo
+    n_rows = max(n_rows - n_rows % factor, factor)
+
+    if n_rows >= height:
+        return [(None, None)]
+
+    stripes = []
+    cols = slice(0, width)
+    for start in range(0, height, n_rows):
+        stop = min(start + n_rows, height)
+
+        if periodic:
+            rows = np.arange(start - halo, stop + halo) % height
+            core = slice(halo, halo + stop - start)
+        else:
+            rows = slice(max(start - halo, 0), min(stop + halo, height))
+            core = slice(start - rows.start, stop - rows.start)
+
+        stripes.append(((rows, cols), core))
+
+    return stripes
+
+
+class OrderStatistics(object):
+    """
+    Exact order statistics of values which are given in parts, one part per stripe.
+    The ranks depend on the number of values, see get_ranks of the metrics.
+
+    Each pass over all parts narrows down the candidates of each rank with a histogram
+    of the next bits of their sortable bit patterns, until the candidates fit into
+    max_candidates and the rank is selected among them.
+    """
+
+    def __init__(self, get_ranks, max_candidates):
+        self.get_ranks = get_ranks
+        self.max_candidates = max_candidates
+        self.n_values = 0
+        self.dtype = None
+        self.histogram = None
+        self.ranks = None
+
+    def add(self, values):
+        if self.dtype is None:
+            self.dtype = values.dtype
+        keys = get_sortable_keys(values)
+
+        # first pass: histogram of all values, the ranks are not yet known
+        if self.ranks is None:
+            self.n_values += np.size(values)
+            self.histogram = add_to_histogram(self.histogram, keys, 0)
+            return
+
+        for rank in self.ranks:
+            if rank.value is None:
+                rank.add(values, keys, self.max_candidates)
+
+    def finish_pass(self):
+        if self.ranks is None:
+            self.ranks = [RankCandidates(r, self.n_values, self.histogram)
+                          for r in self.get_ranks(self.n_values)]
+            self.histogram = None
+
+        for rank in self.ranks:
+            if rank.value is None:
+                rank.finish_pass(self.dtype)
+
+    def is_done(self):
+        return self.ranks is not None and all(rank.value is not None for rank in self.ranks)
+
+    def get_values(self):
+        return np.asarray([rank.value for rank in self.ranks], dtype=self.dtype)
+
+
+class RankCandidates(object):
+    """
+    Candidates for the value at a rank: all values whose sortable keys start with the prefix.
+    The rank is relative to the candidates.
+    """
+
+    def __init__(self, rank, n_candidates, histogram):
+        self.rank = rank
+        self.prefix = 0
+        self.n_prefix_bits = 0
+        self.n_candidates = n_candidates
+        self.histogram = histogram
+        self.candidates = []
+        self.value = None
+
+    def add(self, values, keys, max_candidates):
+        if self.n_prefix_bits == 0:
+            m_candidates = slice(None)
+        else:
+            key_type = keys.dtype
+            shift = key_type.type(8 * key_type.itemsize - self.n_prefix_bits)
+            m_candidates = (keys >> shift) == self.prefix
+
+        if self.n_candidates <= max_candidates:
+            self.candidates.append(values[m_candidates])
+        else:
+            self.histogram = add_to_histogram(self.histogram, keys[m_candidates], self.n_prefix_bits)
+
+    def finish_pass(self, dtype):
+        if self.candidates:
+            candidates = np.concatenate(self.candidates)
+            self.value = np.partition(candidates, self.rank)[self.rank]
+        elif self.histogram is not None:
+            self.narrow(dtype)
+
+    def narrow(self, dtype):
+        # the new candidates are those in the bin of the histogram which contains the rank
+        histogram, self.histogram = self.histogram, None
+        cumulative = np.cumsum(histogram)
+        digit = int(np.searchsorted(cumulative, self.rank, side="right"))
+        if digit > 0:
+            self.rank -= int(cumulative[digit - 1])
+
+        key_type = get_key_type(dtype)
+        self.prefix = (key_type.type(self.prefix) << key_type.type(HISTOGRAM_BITS)) | key_type.type(digit)
+        self.n_prefix_bits += HISTOGRAM_BITS
+        self.n_candidates = int(histogram[digit])
+
+        # all bits are resolved, hence all candidates are equal
+        if self.n_prefix_bits == 8 * key_type.itemsize:
+            self.value = get_value_from_key(self.prefix, dtype)
+
+
+def add_to_histogram(histogram, keys, n_prefix_bits):
+    # histogram of the bits which follow the prefix
+    key_type = keys.dtype
+    shift = key_type.type(8 * key_type.itemsize - n_prefix_bits - HISTOGRAM_BITS)
+    digits = (keys >> shift) & key_type.type(2 ** HISTOGRAM_BITS - 1)
+    counts = np.bincount(digits.astype(np.intp), minlength=2 ** HISTOGRAM_BITS)
+    if histogram is None:
+        return counts
+    return histogram + counts
+
+
+def get_key_type(dtype):
+    return np.dtype("u%d" % np.dtype(dtype).itemsize)
+
+
+def get_sortable_keys(values):
+    # unsigned integers in the same order as the floating point values, NaN is not supported
+    key_type = get_key_type(values.dtype)
+    bits = np.ascontiguousarray(values).view(key_type)
+    sign_bit = key_type.type(1) << key_type.type(8 * key_type.itemsize - 1)
+    return np.where(bits & sign_bit, ~bits, bits | sign_bit)
+
+
+def get_value_from_key(key, dtype):
+    key_type = get_key_type(dtype)
+    sign_bit = key_type.type(1) << key_type.type(8 * key_type.itemsize - 1)
+    bits = key ^ sign_bit if key & sign_bit else ~key
+    return np.asarray([bits], dtype=key_type).view(dtype)[0]
@@ -30,15 +30,16 @@
 ############################################################################
 
 
-import ConfigParser
 import abc
+import glob
 import os.path as op
 
 import numpy as np
-from scipy import signal as ssig
+import scipy.ndimage as ndimage
 
 from toolkit import settings
-from toolkit.utils import file_io, misc
+from toolkit.utils import data_cache, file_io, misc, scene_bundle
+from toolkit.utils.packed_mask import PackedMask
 
 
 class BaseScene(object):
@@ -66,30 +67,33 @@ class BaseScene(object):
             data_path = settings.DATA_PATH
         self.data_path = op.join(data_path, self.get_category(), self.get_name())
 
+        # prefer precompiled scene data if available
+        self.bundle = scene_bundle.load_bundle(self.data_path)
+
         # set scene params from file
-        if path_to_config is None:
-            path_to_config = op.join(self.data_path, "parameters.cfg")
-
-        with open(path_to_config, "r") as f:
-            parser = ConfigParser.ConfigParser()
-            parser.readfp(f)
-
-            section = "intrinsics"
-            self.width = int(parser.get(section, 'image_resolution_x_px'))
-            self.height = int(parser.get(section, 'image_resolution_y_px'))
-            self.focal_length_mm = float(parser.get(section, 'focal_length_mm'))
-            self.sensor_mm = float(parser.get(section, 'sensor_size_mm'))
-
-            section = "extrinsics"
-            self.num_cams_x = int(parser.get(section, 'num_cams_x'))
-            self.num_cams_y = int(parser.get(section, 'num_cams_y'))
-            self.baseline_mm = float(parser.get(section, 'baseline_mm'))
-            self.focus_dist_m = float(parser.get(section, 'focus_distance_m'))
-
-            section = "meta"
-            self.disp_min = float(parser.get(section, 'disp_min'))
-            self.disp_max = float(parser.get(section, 'disp_max'))
-            self.highres_scale = float(parser.get(section, 'depth_map_scale'))
+        if path_to_config is None and self.bundle is not None:
+            parameters = self.bundle.get_parameters()
+        else:
+            if path_to_config is None:
+                path_to_config = op.join(self.data_path, "parameters.cfg")
+            parameters = file_io.read_parameters(path_to_config)
+
+        section = parameters["intrinsics"]
+        self.width = int(section['image_resolution_x_px'])
+        self.height = int(section['image_resolution_y_px'])
+        self.focal_length_mm = float(section['focal_length_mm'])
+        self.sensor_mm = float(section['sensor_size_mm'])
+
+        section = parameters["extrinsics"]
+        self.num_cams_x = int(section['num_cams_x'])
+        self.num_cams_y = int(section['num_cams_y'])
+        self.baseline_mm = float(section['baseline_mm'])
+        self.focus_dist_m = float(section['focus_distance_m'])
+
+        section = parameters["meta"]
+        self.disp_min = float(section['disp_min'])
+        self.disp_max = float(section['disp_max'])
+        self.highres_scale = float(section['depth_map_scale'])
 
     def __str__(self):
         return self.get_name()
@@ -158,25 +162,24 @@ class BaseScene(object):
         disp_map = (f * self.focus_dist_m / depth_map - f) / self.focus_dist_m / self.sensor_mm
         return disp_map
 
-    def get_depth_normals(self, depth_map):
+    def get_depth_normals(self, depth_map, roi=None):
+        # with roi = (rows, cols), the depth map is the given crop of the full frame
+        dtype = misc.get_float_dtype()
+        zz = np.asarray(depth_map, dtype=dtype)
         h, w = np.shape(depth_map)
-        zz = depth_map
-        xx, yy = np.meshgrid(range(0, h), range(0, w))
-        xx = (xx / (h - 1.0) * 0.5) * self.sensor_mm * zz / self.focal_length_mm
-        yy = (yy / (w - 1.0) * 0.5) * self.sensor_mm * zz / self.focal_length_mm
-
-        kernel = np.asarray([[3., 10., 3.], [0., 0., 0.], [-3., -10., -3.]])
-        kernel /= 64.
-
-        dxdx = ssig.convolve2d(xx, kernel, mode="same", boundary="wrap")
-        dydx = ssig.convolve2d(yy, kernel, mode="same", boundary="wrap")
-        dzdx = ssig.convolve2d(zz, kernel, mode="same", boundary="wrap")
+        if roi is None:
+            grid_x, grid_y = self._get_coordinate_grids(h, w, dtype)
+        else:
+            grids = self._get_coordinate_grids(self.get_height(), self.get_width(), dtype)
+            grid_x, grid_y = [grid[roi] for grid in grids]
+        xx = grid_x * self.sensor_mm * zz / self.focal_length_mm
+        yy = grid_y * self.sensor_mm * zz / self.focal_length_mm
 
-        dxdy = ssig.convolve2d(xx, np.transpose(kernel), mode="same", boundary="wrap")
-        dydy = ssig.convolve2d(yy, np.transpose(kernel), mode="same", boundary="wrap")
-        dzdy = ssig.convolve2d(zz, np.transpose(kernel), mode="same", boundary="wrap")
+        dxdx, dxdy = self._get_gradients(xx)
+        dydx, dydy = self._get_gradients(yy)
+        dzdx, dzdy = self._get_gradients(zz)
 
-        normal_map = np.full((h, w, 3), fill_value=np.nan)
+        normal_map = np.full((h, w, 3), fill_value=np.nan, dtype=dtype)
 
         normal_map[:, :, 0] = (dzdx * dxdy - dxdx * dzdy)
         normal_map[:, :, 1] = - (dydx * dzdy - dzdx * dydy)
@@ -187,6 +190,35 @@ class BaseScene(object):
 
         return normal_map
 
+    def get_gt_normals(self, gt=None):
+        # ground truth normals are shared by all algorithms and normal metrics,
+        # the ground truth may be given to avoid reading it again
+        if gt is None:
+            gt = self.get_gt()
+        return self._get_cached(("gt_normals", settings.FLOAT_PRECISION),
+                                lambda: self.get_depth_normals(self.disp2depth(gt)))
+
+    @staticmethod
+    def _get_coordinate_grids(h, w, dtype):
+        def create_grids():
+            xx, yy = np.meshgrid(np.arange(h, dtype=dtype), np.arange(w, dtype=dtype))
+            return xx / (h - 1.0) * 0.5, yy / (w - 1.0) * 0.5
+
+        return data_cache.scene_data.get(("coordinate_grids", h, w, np.dtype(dtype).name), create_grids)
+
+    @staticmethod
+    def _get_gradients(data):
+        # separable version of the 2D kernel [[3, 10, 3], [0, 0, 0], [-3, -10, -3]] / 64
+        # and its transpose, applied with periodic boundary
+        derivative = np.asarray([1., 0., -1.])
+        smoothing = np.asarray([3., 10., 3.]) / 64.
+
+        gradient_x = ndimage.convolve1d(data, derivative, axis=0, mode="wrap")
+        gradient_x = ndimage.convolve1d(gradient_x, smoothing, axis=1, mode="wrap")
+        gradient_y = ndimage.convolve1d(data, smoothing, axis=0, mode="wrap")
+        gradient_y = ndimage.convolve1d(gradient_y, derivative, axis=1, mode="wrap")
+        return gradient_x, gradient_y
+
     def get_normal_vis_from_disp_map(self, disp_map):
         return (self.get_depth_normals(self.disp2depth(disp_map)) + 1.) * .5
 
@@ -195,8 +227,16 @@ class BaseScene(object):
     # ----------------------------------------------------------
 
     def get_center_view(self):
-        fname = "input_Cam%03d.png" % self.get_center_cam()
-        center_view = file_io.read_file(op.join(self.data_path, fname))
+        return self._get_cached("center_view", self._load_center_view)
+
+    def _load_center_view(self):
+        descr = "input_Cam%03d" % self.get_center_cam()
+        if self.gt_scale != 1.0:
+            center_view = self._read_level(descr)
+            if center_view is not None:
+                return center_view
+
+        center_view = self._read_file(descr, "png")
         if self.gt_scale != 1.0:
             center_view = misc.resize_to_shape(center_view,
                                                self.get_height(), self.get_width(), order=0)
@@ -205,6 +245,10 @@ class BaseScene(object):
     def get_gt(self):
         return self.get_disp_map()
 
+    def is_gt(self, data):
+        # whether data is the cached ground truth at the current gt_scale, nothing is read
+        return data is data_cache.scene_data.peek(self._get_cache_key(("gt_disp", "pfm")))
+
     def get_depth_map(self):
         return self._get_data("gt_depth", "pfm")
 
@@ -212,20 +256,52 @@ class BaseScene(object):
         return self._get_data("gt_disp", "pfm")
 
     def get_mask(self, mask_name, binary=True):
-        mask = self._get_data(mask_name, "png")
-        if binary:
-            mask = np.asarray(mask, dtype=np.bool)
-        return mask
+        if not binary:
+            return self._get_data(mask_name, "png")
+        return self.get_packed_mask(mask_name).to_bool()
+
+    def get_packed_mask(self, mask_name):
+        # binary masks are cached bit-packed, the raw mask is not required afterwards
+        return self._get_cached((mask_name, "packed"), lambda: self._load_packed_mask(mask_name))
+
+    def _load_packed_mask(self, mask_name):
+        fpath = self._get_image_path(mask_name)
+        if fpath is None:
+            return PackedMask.from_bool(self._load_data(mask_name, "png"))
+        return file_io.read_binary_mask(fpath)
+
+    def load_packed_masks(self, mask_names):
+        """Decode the given masks concurrently and add them to the cache, e.g. to warm up."""
+        fpaths_by_name = dict()
+        for mask_name in set(mask_names):
+            # masks from the scene bundle or with resampling are loaded on demand
+            fpath = self._get_image_path(mask_name)
+            key = self._get_cache_key((mask_name, "packed"))
+            if fpath is not None and op.isfile(fpath) and key not in data_cache.scene_data:
+                fpaths_by_name[mask_name] = fpath
+
+        mask_names = fpaths_by_name.keys()
+        masks = file_io.read_batch([fpaths_by_name[mask_name] for mask_name in mask_names],
+                                   read_func=file_io.read_binary_mask)
+        for mask_name, mask in zip(mask_names, masks):
+            data_cache.scene_data.add(self._get_cache_key((mask_name, "packed")), mask)
 
     def _get_data(self, descr, file_type, order=0):
+        return self._get_cached((descr, file_type),
+                                lambda: self._load_data(descr, file_type, order))
+
+    def _load_data(self, descr, file_type, order=0):
         if self.gt_scale == 1:
             # original lowres version if gt_scale is 1
-            fname = "%s_%s.%s" % (descr, settings.LOWRES, file_type)
-            data = file_io.read_file(op.join(self.data_path, fname))
+            data = self._read_file("%s_%s" % (descr, settings.LOWRES), file_type)
         else:
+            # precomputed version if available
+            data = self._read_level(descr)
+            if data is not None:
+                return data
+
             # original highres version if gt_scale matches highres_scale
-            fname = "%s_%s.%s" % (descr, settings.HIGHRES, file_type)
-            data = file_io.read_file(op.join(self.data_path, fname))
+            data = self._read_file("%s_%s" % (descr, settings.HIGHRES), file_type)
 
             # otherwise scale highres version to required shape
             if self.gt_scale != self.highres_scale:
@@ -233,7 +309,64 @@ class BaseScene(object):
 
         return data
 
+    def _get_image_path(self, descr):
+        # path to the png which matches gt_scale without resampling, None if not applicable
+        if self.gt_scale == 1:
+            name = "%s_%s" % (descr, settings.LOWRES)
+        elif self.gt_scale == self.highres_scale:
+            name = "%s_%s" % (descr, settings.HIGHRES)
+        else:
+            return None
+
+        if self.bundle is not None and name in self.bundle:
+            return None
+        return op.join(self.data_path, "%s.png" % name)
+
+    def _read_level(self, descr):
+        # gt_scale levels are only stored in the scene bundle, see compile_scenes.py
+        name = scene_bundle.get_level_name(descr, self.gt_scale)
+        if self.bundle is None or name not in self.bundle:
+            return None
+        return self.bundle.get(name)
+
+    def _read_file(self, name, file_type):
+        if self.bundle is not None and name in self.bundle:
+            return self.bundle.get(name)
+
+        # ground truth is memory-mapped, the cached arrays are read-only anyway
+        kwargs = {"mmap": True} if file_type == "pfm" else dict()
+        return file_io.read_file(op.join(self.data_path, "%s.%s" % (name, file_type)), **kwargs)
+
+    def get_data_files(self):
+        """Existing source files of ground truth, masks and center view."""
+        fnames = glob.glob(op.join(self.data_path, "gt_*.pfm")) + \
+            glob.glob(op.join(self.data_path, "mask_*.png")) + \
+            [op.join(self.data_path, "input_Cam%03d.png" % self.get_center_cam())]
+        return sorted(fname for fname in fnames if op.isfile(fname))
+
+    def has_data(self, descr, resolution, file_type="png"):
+        name = "%s_%s" % (descr, resolution)
+        if self.bundle is not None and name in self.bundle:
+            return True
+        return op.isfile(op.join(self.data_path, "%s.%s" % (name, file_type)))
+
+    def _get_cached(self, descr, load_data):
+        return data_cache.scene_data.get(self._get_cache_key(descr), load_data)
+
+    def _get_cache_key(self, descr):
+        # scene data is shared across scene instances and evaluations,
+        # the key identifies the scene directory and the current resolution
+        return self.data_path, descr, self.gt_scale
+
     def get_boundary_mask(self, ignore_boundary=True):
+        return self.get_packed_boundary_mask(ignore_boundary).to_bool()
+
+    def get_packed_boundary_mask(self, ignore_boundary=True):
+        return self._get_cached(("boundary", self.boundary_offset, ignore_boundary),
+                                lambda: PackedMask.from_bool(
+                                    self._create_boundary_mask(ignore_boundary)))
+
+    def _create_boundary_mask(self, ignore_boundary):
         if ignore_boundary:
             mask = np.full(self.get_shape(), fill_value=0, dtype=np.bool)
             f_offset = self.get_boundary_offset()
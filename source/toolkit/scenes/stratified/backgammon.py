@@ -57,13 +57,10 @@ class Backgammon(BaseStratified):
 
     def plot_fattening_thinning(self, algorithms, n_bins=15, subdir="stratified"):
         self.set_high_gt_scale()
-        gt = self.get_gt()
 
         # prepare masks
         m_eval = self.get_boundary_mask()
-        m_extrapolated_bg = self.get_bg_extrapolation()
         m_fg_thin = self.get_fg_thinning_mask() * m_eval
-        m_extrapolated_fg = self.get_fg_extrapolation()
         m_fg_fat = self.get_fg_fattening_mask() * m_eval
         m_bins = self.get_vertical_bins()
 
@@ -101,20 +98,18 @@ class Backgammon(BaseStratified):
 
         # compute scores for vertical bins
         x_values = np.arange(0, n_bins, 1)
-        for algorithm in algorithms:
-            algo_result = misc.get_algo_result(algorithm, self)
+        fattening_profiles, thinning_profiles = self.get_fattening_thinning_profiles(algorithms, n_bins)
+
+        for idx_a, algorithm in enumerate(algorithms):
             props = {"color": algorithm.get_color(), "lw": 2,
                      "alpha": 0.8, "markersize": 7, "markeredgewidth": 0}
 
             plt.subplot(rows, cols, 2)
-            mask_fattening = fattening.get_fattening(algo_result, gt, m_extrapolated_fg) * m_eval
-            y_values_fat = self.get_bin_scores(x_values, m_bins, n_bins, m_fg_fat, mask_fattening)
-            plt.plot(x_values, y_values_fat, "o-", **props)
+            plt.plot(x_values, fattening_profiles[idx_a, :], "o-", **props)
 
             plt.subplot(rows, cols, 3)
-            mask_thinning = thinning.get_thinning(algo_result, gt, m_extrapolated_bg) * m_eval
-            y_values_thin = self.get_bin_scores(x_values, m_bins, n_bins, m_fg_thin, mask_thinning)
-            plt.plot(x_values, y_values_thin, "o-", label=algorithm.get_display_name(), **props)
+            plt.plot(x_values, thinning_profiles[idx_a, :], "o-",
+                     label=algorithm.get_display_name(), **props)
 
         for idx_m, metric in enumerate([fattening, thinning]):
             plt.subplot(rows, cols, idx_m+2)
@@ -129,26 +124,75 @@ class Backgammon(BaseStratified):
         fig_path = plotting.get_path_to_figure("backgammon_fattening_thinning", subdir=subdir)
         plotting.save_fig(fig, fig_path)
 
-    @staticmethod
-    def get_bin_scores(x_values, m_bins, n_bins, m_eval, m_algo_result):
-        y_values = np.full(np.shape(x_values), fill_value=np.nan)
-        for i in range(n_bins):
-            mask = (m_bins == i+1) * m_eval
-            y_values[i] = misc.percentage(np.sum(mask), np.sum(m_algo_result * mask))
+    def get_fattening_thinning_profiles(self, algorithms, n_bins=15):
+        """
+        Fattening and thinning scores per vertical bin from left to right, at high resolution.
+        Returns two matrices with shape (n_algorithms, n_bins).
+        """
+        self.set_high_gt_scale()
+        fattening_profiles = np.full((len(algorithms), n_bins), fill_value=np.nan)
+        thinning_profiles = np.full((len(algorithms), n_bins), fill_value=np.nan)
+
+        for idx_a, algorithm in enumerate(algorithms):
+            algo_dir = misc.get_path_to_algo_data(algorithm)
+            algo_result = misc.get_algo_result_from_dir(algo_dir, self, upsample=False)
+            fattening_profiles[idx_a, :], thinning_profiles[idx_a, :] = \
+                self.get_fattening_thinning_profile(algo_result, n_bins)
+
+        return fattening_profiles, thinning_profiles
+
+    def get_fattening_thinning_profile(self, algo_result, n_bins=15):
+        # scores per vertical bin for one algorithm result at the current resolution
+        gt = self.get_gt()
+        m_fattening = BackgammonFattening.get_fattening(algo_result, gt, self.get_fg_extrapolation())
+        m_thinning = BackgammonThinning.get_thinning(algo_result, gt, self.get_bg_extrapolation())
 
-        return y_values
+        fattening_bins, fattening_sizes = self.get_bin_labels(self.mn_fg_fat, n_bins)
+        thinning_bins, thinning_sizes = self.get_bin_labels(self.mn_fg_thin, n_bins)
+
+        return (self.get_bin_scores_from_labels(fattening_bins, fattening_sizes, m_fattening),
+                self.get_bin_scores_from_labels(thinning_bins, thinning_sizes, m_thinning))
+
+    def get_bin_labels(self, mask_name, n_bins):
+        """
+        Vertical bin of each pixel in the evaluation area of the given mask, 0 for all other
+        pixels. Returns the labels and the number of pixels per bin.
+        """
+        return self._get_cached(("bin_labels", mask_name, n_bins),
+                                lambda: self._create_bin_labels(mask_name, n_bins))
+
+    def _create_bin_labels(self, mask_name, n_bins):
+        m_eval = self.get_mask(mask_name) * self.get_boundary_mask()
+        m_bins = self.get_vertical_bins()
+        # bin ids are small, labels keep the compact type of the mask
+        bin_labels = np.where(m_eval * (m_bins <= n_bins), m_bins, 0).astype(np.min_scalar_type(n_bins))
+        bin_sizes = np.bincount(bin_labels.ravel(), minlength=n_bins + 1)[1:]
+        return bin_labels, bin_sizes
+
+    @staticmethod
+    def get_bin_scores_from_labels(bin_labels, bin_sizes, m_algo_result):
+        # one labeled reduction over all bins
+        n_bins = np.size(bin_sizes)
+        n_bad = np.bincount(bin_labels[m_algo_result], minlength=n_bins + 1)[1:]
+        return misc.percentages(bin_sizes, n_bad)
 
     # -------------------------
     # evaluation masks
     # -------------------------
 
     def get_fg_extrapolation(self):
-        fg_extr = np.zeros(self.get_shape(), dtype=np.float)
+        return self._get_cached("fg_extrapolation", self._create_fg_extrapolation)
+
+    def _create_fg_extrapolation(self):
+        fg_extr = np.zeros(self.get_shape(), dtype=misc.get_float_dtype())
         fg_extr[:, :] = self.get_gt()[:, int(14*self.gt_scale):int(14*self.gt_scale)+1]
         return fg_extr
 
     def get_bg_extrapolation(self):
-        bg_extr = np.zeros(self.get_shape(), dtype=np.float)
+        return self._get_cached("bg_extrapolation", self._create_bg_extrapolation)
+
+    def _create_bg_extrapolation(self):
+        bg_extr = np.zeros(self.get_shape(), dtype=misc.get_float_dtype())
         bg_extr[:, :] = self.get_gt()[:, self.get_width()-11:self.get_width()-10]
         return bg_extr
 
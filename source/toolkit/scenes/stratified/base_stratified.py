@@ -37,6 +37,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 from toolkit import settings
+from toolkit.metrics import EvaluationContext
 from toolkit.scenes import BaseScene
 from toolkit.utils import log, misc, plotting
 
@@ -112,12 +113,14 @@ class BaseStratified(BaseScene):
                                       colorbar_bins=5, fontsize=fs-4)
 
             # score and background color for metrics
+            context = EvaluationContext(algo_result, gt, self)
             for idx_m, metric in enumerate(metrics):
+                result = metric.get_result_from_context(context)
+                score = result.score
 
                 if with_metric_vis:
                     plt.subplot(gs[(2+idx_m)*cols+idx_a+1])
-                    score, vis = metric.get_score(algo_result, gt, self, with_visualization=True)
-                    cm3 = plt.imshow(vis, **settings.metric_args(metric))
+                    cm3 = plt.imshow(result.get_visualization(), **settings.metric_args(metric))
 
                     if idx_a == 0:
                         plt.ylabel(metric.get_short_name(), fontsize=fs)
@@ -125,9 +128,6 @@ class BaseStratified(BaseScene):
                         plotting.add_colorbar(gs[(2+idx_m)*cols+idx_a+2], cm3, cb_height, cb_width,
                                               colorbar_bins=metric.colorbar_bins, fontsize=fs-4)
 
-                else:
-                    score = metric.get_score(algo_result, gt, self)
-
                 plt.subplot(gs[(2+idx_m+offset)*cols+idx_a+1])
                 plt.imshow(dummy*score,
                            **settings.score_color_args(vmin=metric.vmin, vmax=metric.vmax))
@@ -33,7 +33,7 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
-from toolkit.metrics import DotsBackgroundMSE, MissedDots, MSE
+from toolkit.metrics import DotsBackgroundMSE, EvaluationContext, MissedDots
 from toolkit.scenes import BaseStratified
 from toolkit.utils import plotting, misc
 
@@ -56,26 +56,11 @@ class Dots(BaseStratified):
         self.set_low_gt_scale()
         fig = plt.figure(figsize=(8, 4))
 
-        grid = self.get_boxes()
-        box_ids = sorted(list(np.unique(grid)))
-        box_ids.remove(0)
-        n_boxes = len(box_ids)
-        mse = MSE()
-        gt = self.get_gt()
-        m_basic = self.get_boundary_mask()
-        m_eval = self.get_background_mask() * m_basic
-
-        x_values = np.arange(1, n_boxes + 1)
-
-        for algorithm in algorithms:
-            algo_result = misc.get_algo_result(algorithm, self)
-            y_values = np.full(n_boxes, fill_value=np.nan)
+        mse_per_cell = self.get_background_mse_per_cell(algorithms)
+        x_values = np.arange(1, np.shape(mse_per_cell)[1] + 1)
 
-            for idx_b, box_id in enumerate(box_ids):
-                m_current = m_eval * (grid == box_id)
-                y_values[idx_b] = mse.get_masked_score(algo_result, gt, m_current)
-
-            plt.plot(x_values, y_values, "o-", color=algorithm.get_color(),
+        for idx_a, algorithm in enumerate(algorithms):
+            plt.plot(x_values, mse_per_cell[idx_a, :], "o-", color=algorithm.get_color(),
                      label=algorithm.get_display_name(), lw=2, alpha=0.9, markeredgewidth=0)
 
         plt.legend(frameon=False, loc="upper right", ncol=1,
@@ -88,6 +73,22 @@ class Dots(BaseStratified):
         fig_path = plotting.get_path_to_figure("dots_per_box", subdir=subdir)
         plotting.save_tight_figure(fig, fig_path, remove_ticks=False)
 
+    def get_background_mse_per_cell(self, algorithms):
+        """
+        MSE on the background of each cell, i.e. with increasing noise, at low resolution.
+        Returns a matrix with shape (n_algorithms, n_cells).
+        """
+        self.set_low_gt_scale()
+        gt = self.get_gt()
+        metric = DotsBackgroundMSE()
+        mse_per_cell = np.full((len(algorithms), np.size(self.get_cell_labels()[1])), fill_value=np.nan)
+
+        for idx_a, algorithm in enumerate(algorithms):
+            context = EvaluationContext(misc.get_algo_result(algorithm, self), gt, self)
+            mse_per_cell[idx_a, :] = metric.get_scores_per_cell(context)
+
+        return mse_per_cell
+
     # -------------------------
     # evaluation masks
     # -------------------------
@@ -100,3 +101,48 @@ class Dots(BaseStratified):
 
     def get_dots_by_size(self):
         return self.get_mask(self.mn_dots_by_size, binary=False)
+
+    def get_dot_labels(self):
+        """
+        Label image with one label per dot and box, 0 for all other pixels.
+        Returns the labels and the number of pixels per label, starting at label 1.
+        """
+        return self._get_cached("dot_labels", self._create_dot_labels)
+
+    def get_cell_labels(self):
+        """
+        Label image with the index + 1 of the cell on the background within the
+        boundary, 0 for all other pixels. Returns the labels and the number of pixels per cell.
+        """
+        return self._get_cached("cell_labels", self._create_cell_labels)
+
+    def _create_cell_labels(self):
+        grid = self.get_boxes()
+        box_ids = [box_id for box_id in np.unique(grid) if box_id != 0]
+
+        cell_labels = np.zeros(int(np.max(grid)) + 1, dtype=np.min_scalar_type(len(box_ids)))
+        cell_labels[box_ids] = np.arange(1, len(box_ids) + 1)
+
+        m_eval = self.get_background_mask() * self.get_boundary_mask()
+        labels = np.where(m_eval, cell_labels[grid], 0).astype(cell_labels.dtype)
+        n_pixels = np.bincount(labels.ravel(), minlength=len(box_ids) + 1)[1:]
+        return labels, n_pixels
+
+    def _create_dot_labels(self):
+        grid = self.get_boxes()
+        dots_by_size = self.get_dots_by_size().astype(np.int32)
+
+        box_ids = [box_id for box_id in np.unique(grid) if box_id != 0]
+        # use only the nine biggest dots per box
+        n_dots = len([dl for dl in np.unique(dots_by_size) if 0 < dl < 9])
+
+        # consecutive box indices, dot labels are numbered per box
+        box_indices = np.zeros(int(np.max(grid)) + 1, dtype=np.int32)
+        box_indices[box_ids] = np.arange(len(box_ids))
+
+        m_dots = (grid != 0) * (dots_by_size > 0) * (dots_by_size <= n_dots)
+        n_labels = len(box_ids) * n_dots
+        labels = np.where(m_dots, box_indices[grid] * n_dots + dots_by_size, 0)
+        labels = labels.astype(np.min_scalar_type(n_labels))
+        n_pixels = np.bincount(labels.ravel(), minlength=n_labels + 1)[1:]
+        return labels, n_pixels
@@ -35,7 +35,7 @@ import numpy as np
 
 from toolkit.metrics import PyramidsParallelBumpiness, PyramidsSlantedBumpiness
 from toolkit.scenes import BaseStratified
-from toolkit.utils import plotting, misc
+from toolkit.utils import grouped_statistics, plotting, misc
 
 
 class Pyramids(BaseStratified):
@@ -60,15 +60,11 @@ class Pyramids(BaseStratified):
         self.set_low_gt_scale()
 
         # prepare data
-        gt = self.get_gt()
-        m_eval = self.get_boundary_mask()
-        mask_names = ["Sphere In", "Sphere Out"]
-        masks = [self.get_sphere_in()*m_eval, self.get_sphere_out()*m_eval]
-
         factor = 1000.0
-        gt_rounded = np.asarray(gt * factor, dtype=np.int)
-        disp_values = np.unique(gt_rounded)
-        n_values = np.size(disp_values)
+        mask_names = ["Sphere In", "Sphere Out"]
+        masks = self.get_disp_vs_gt_disp_masks()
+        gt_rounded = self.get_gt_rounded(factor)
+        curves = self.get_disp_vs_gt_disp_curves(algorithms, factor)
 
         # prepare figure
         fig = plt.figure(figsize=(14, 6))
@@ -77,24 +73,13 @@ class Pyramids(BaseStratified):
         legend_lines = []
         legend_labels = []
 
-        for algorithm in algorithms:
-            algo_result = misc.get_algo_result(algorithm, self)
-
-            # go through ground truth disparity values
-            for idx_d in range(n_values):
-                current_disp = disp_values[idx_d]
-                m_disp = (gt_rounded == current_disp)
-
-                # find median disparity of algorithm result at image regions
-                # of given ground truth disparity value
-                for idx_m, (mask, mask_name) in enumerate(zip(masks, mask_names)):
-                    algo_disps = algo_result[m_disp * mask]
-
-                    if np.size(algo_disps) > 0:
-                        median = np.median(algo_disps)
-                        plt.subplot(rows, cols, idx_m+1)
-                        s = plt.scatter(current_disp/factor, median,
-                                        marker="o", c=algorithm.get_color(), alpha=0.8, s=5, lw=0)
+        for idx_a, algorithm in enumerate(algorithms):
+            # median disparity of algorithm result at image regions
+            # of given ground truth disparity value
+            for idx_m, (gt_disps, medians) in enumerate(curves):
+                plt.subplot(rows, cols, idx_m+1)
+                s = plt.scatter(gt_disps, medians[idx_a, :],
+                                marker="o", c=algorithm.get_color(), alpha=0.8, s=5, lw=0)
 
             legend_lines.append(s)
             legend_labels.append(algorithm.get_display_name())
@@ -121,6 +106,35 @@ class Pyramids(BaseStratified):
         plotting.save_tight_figure(fig, fig_path, remove_ticks=False,
                                    hspace=0.2, wspace=0.3, padding_top=0.88)
 
+    def get_disp_vs_gt_disp_curves(self, algorithms, factor=1000.0):
+        """
+        Median algorithm disparity per ground truth disparity, rounded down to 1/factor,
+        for the inner and outer sphere at low resolution. Returns (gt_disps, medians) per mask,
+        medians is a matrix with shape (n_algorithms, n_gt_disps).
+        """
+        self.set_low_gt_scale()
+        gt_rounded = self.get_gt_rounded(factor)
+        masks = self.get_disp_vs_gt_disp_masks()
+        algo_results = [misc.get_algo_result(algorithm, self) for algorithm in algorithms]
+
+        curves = []
+        for mask in masks:
+            gt_disps = np.unique(gt_rounded[mask]) / factor
+            medians = np.full((len(algorithms), np.size(gt_disps)), fill_value=np.nan)
+            for idx_a, algo_result in enumerate(algo_results):
+                medians[idx_a, :] = grouped_statistics.get_grouped_medians(gt_rounded[mask],
+                                                                           algo_result[mask])[1]
+            curves.append((gt_disps, medians))
+
+        return curves
+
+    def get_gt_rounded(self, factor=1000.0):
+        return np.asarray(self.get_gt() * factor, dtype=np.int)
+
+    def get_disp_vs_gt_disp_masks(self):
+        m_eval = self.get_boundary_mask()
+        return [self.get_sphere_in() * m_eval, self.get_sphere_out() * m_eval]
+
     # -------------------------
     # evaluation masks
     # -------------------------
@@ -129,10 +143,18 @@ class Pyramids(BaseStratified):
         return self.get_mask(self.mn_plane)
 
     def get_objects(self):
-        return self.get_spheres() + self.get_pyramids()
+        return self.get_packed_objects().to_bool()
+
+    def get_packed_objects(self):
+        return self._get_cached("objects", lambda: self.get_packed_spheres() |
+                                self.get_packed_mask(self.mn_pyramids))
 
     def get_spheres(self):
-        return self.get_sphere_in() + self.get_sphere_out()
+        return self.get_packed_spheres().to_bool()
+
+    def get_packed_spheres(self):
+        return self._get_cached("spheres", lambda: self.get_packed_mask(self.mn_sphere_in) |
+                                self.get_packed_mask(self.mn_sphere_out))
 
     def get_sphere_in(self):
         return self.get_mask(self.mn_sphere_in)
@@ -47,16 +47,25 @@ FIG_PATH = op.normpath(op.join(EVAL_PATH, "figures"))
 TMP_PATH = op.normpath(op.join(base_path, "../tmp"))
 
 PATH_TO_ALGO_META_DATA = op.normpath(op.join(ALGO_PATH, "meta_data.json"))
+# content fingerprints of input files, used to detect stale cached results
+PATH_TO_FINGERPRINTS = op.normpath(op.join(TMP_PATH, "fingerprints.json"))
 
 HEIGHT = 512
 WIDTH = 512
 BAD_PIX_THRESH = 0.07
+# percentages of the quantile profile, computed with a single selection
+QUANTILE_PROFILE = [10, 25, 50, 75, 90]
 
 FIG_SIZE_EVALUATION = (6, 3)
 
 DIR_NAME_DISP_MAPS = "disp_maps"
 DIR_NAME_RUNTIMES = "runtimes"
 
+# precompiled scene data, see compile_scenes.py
+SCENE_BUNDLE_NAME = "scene_data.bundle"
+# gt_scale levels which are precomputed for the bundle
+PYRAMID_SCALES = [1, 2, 5, 10]
+
 STRATIFIED_METRIC = "Stratified"
 PHOTOREALISTIC_METRIC = "Photorealistic"
 GENERAL_METRIC = "General"
@@ -65,6 +74,30 @@ LOWRES = "lowres"
 HIGHRES = "highres"
 PIXELIZE = True
 
+# number of scenes whose data is read in the background during the evaluation, 0 to disable
+PREFETCH_DEPTH = 1
+
+# image decoding backend, see file_io.IMAGE_DECODERS and file_io.MASK_DECODERS,
+# and threads for decoding batches of images
+IMAGE_DECODER = "pil"
+DECODING_THREADS = 4
+
+# floating point type of intermediate results, e.g. normals and meta algorithm stacks
+# "float32" halves the memory traffic but scores may differ slightly from the reference
+FLOAT_PRECISION = "float64"
+
+# replicate each low resolution pixel to a block of gt_scale x gt_scale pixels for high resolution
+# metrics instead of upsampling with sci.zoom, which avoids allocating the upsampled algorithm result.
+# scores differ from the reference, as sci.zoom samples corner-aligned coordinates
+UPSAMPLE_BY_BLOCKS = False
+
+# upper bound for decoded scene data (ground truth, masks, ...) kept in memory
+CACHE_SIZE_MB = 2048
+
+# memory budget for intermediate results of the scores, which are then computed on stripes of rows,
+# None to evaluate the full frame at once; visualizations always require the full frame
+EVALUATION_MEMORY_MB = None
+
 TEST = "test"
 TRAINING = "training"
 ADDITIONAL = "additional"
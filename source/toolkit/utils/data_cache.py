@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+from toolkit import settings
+
+
+class DataCache(object):
+    """
+    Bounded least recently used cache for arrays which are expensive to load,
+    e.g. decoded ground truth, masks and center views of the scenes.
+    The cache may be shared across threads, data is loaded outside of the lock.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, load_data):
+        with self.lock:
+            try:
+                # move entry to the end to mark it as most recently used
+                data, n_bytes = self.entries.pop(key)
+                self.entries[key] = (data, n_bytes)
+                return data
+            except KeyError:
+                pass
+
+        data = load_data()
+        self.add(key, data)
+        return data
+
+    def peek(self, key):
+        # cached data or None, without loading it or marking it as used
+        with self.lock:
+            entry = self.entries.get(key)
+        return None if entry is None else entry[0]
+
+    def add(self, key, data):
+        n_bytes = get_n_bytes(data)
+
+        # entries which exceed the whole budget are not cached at all
+        if n_bytes > self.max_bytes:
+            return
+
+        # cached arrays are shared, hence they must not be modified by the caller
+        if isinstance(data, np.ndarray):
+            data.flags.writeable = False
+
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+
+            self.entries[key] = (data, n_bytes)
+            self.n_bytes += n_bytes
+            self.shrink(self.max_bytes)
+
+    def remove(self, key):
+        with self.lock:
+            _, n_bytes = self.entries.pop(key)
+            self.n_bytes -= n_bytes
+
+    def shrink(self, max_bytes):
+        # evict least recently used entries until the budget is met
+        with self.lock:
+            while self.n_bytes > max_bytes and self.entries:
+                self.remove(next(iter(self.entries)))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.n_bytes = 0
+
+    def set_max_bytes(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.shrink(max_bytes)
+
+
+def get_n_bytes(data):
+    if isinstance(data, (list, tuple)):
+        return sum(get_n_bytes(d) for d in data)
+    return getattr(data, "nbytes", 0)
+
+
+# process-wide cache for scene data, shared by all scene instances
+scene_data = DataCache(max_bytes=int(settings.CACHE_SIZE_MB * 1024 ** 2))
@@ -30,8 +30,10 @@
 ############################################################################
 
 
+import ConfigParser
 import distutils.dir_util as du
 import json
+from multiprocessing.pool import ThreadPool
 import os
 import os.path as op
 import sys
@@ -39,6 +41,7 @@ import zipfile
 
 import numpy as np
 
+from toolkit import settings
 from toolkit.utils import log
 
 
@@ -55,6 +58,22 @@ def read_file(src_file, **kwargs):
         raise NotImplementedError('No support for file: %s' % src_file)
 
 
+def read_batch(src_files, read_func=read_file, n_threads=None):
+    # decoders release the GIL for most of the work, hence files are read concurrently
+    if n_threads is None:
+        n_threads = settings.DECODING_THREADS
+
+    n_threads = min(n_threads, len(src_files))
+    if n_threads <= 1:
+        return [read_func(src_file) for src_file in src_files]
+
+    pool = ThreadPool(processes=n_threads)
+    try:
+        return pool.map(read_func, src_files)
+    finally:
+        pool.close()
+
+
 def write_file(data, tgt_file, **kwargs):
     check_dir_for_fname(tgt_file)
 
@@ -72,11 +91,65 @@ def write_file(data, tgt_file, **kwargs):
 # standard images
 
 def read_img(fpath):
+    return IMAGE_DECODERS[settings.IMAGE_DECODER](fpath)
+
+
+def read_img_pil(fpath):
+    from PIL import Image
+    img = Image.open(fpath)
+
+    # same conversions as scipy.misc.imread
+    if img.mode == "P":
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    elif img.mode == "1":
+        img = img.convert("L")
+
+    return np.array(img)
+
+
+def read_img_scipy(fpath):
     from scipy import misc
     data = misc.imread(fpath)
     return data
 
 
+IMAGE_DECODERS = {"pil": read_img_pil, "scipy": read_img_scipy}
+
+
+def read_binary_mask(fpath):
+    """
+    Read the non-zero pixels of an image as PackedMask, with the backend of settings.IMAGE_DECODER.
+    """
+    return MASK_DECODERS[settings.IMAGE_DECODER](fpath)
+
+
+def read_binary_mask_pil(fpath):
+    # single channel images are decoded directly to the packed form
+    from PIL import Image
+    from toolkit.utils.packed_mask import PackedMask
+
+    img = Image.open(fpath)
+    if img.mode not in ("1", "L"):
+        return PackedMask.from_bool(read_img_pil(fpath))
+
+    if img.mode == "L":
+        img = img.point([0] + [255] * 255, "1")
+
+    # rows of mode "1" images are packed like np.packbits, padding bits are zero
+    width, height = img.size
+    bits = np.frombuffer(img.tobytes(), dtype=np.uint8)
+    return PackedMask(np.reshape(bits, (height, -1)), (height, width))
+
+
+def read_binary_mask_scipy(fpath):
+    # scipy only decodes to full arrays, which are packed afterwards
+    from toolkit.utils.packed_mask import PackedMask
+    return PackedMask.from_bool(read_img_scipy(fpath))
+
+
+MASK_DECODERS = {"pil": read_binary_mask_pil, "scipy": read_binary_mask_scipy}
+
+
 def write_img(img, fpath, cmax=None):
     from scipy import misc
 
@@ -126,8 +199,10 @@ def write_pfm(data, fpath, scale=1, file_identifier="Pf", dtype="float32"):
         ff.write(values)
 
 
-def read_pfm(fpath, expected_identifier="Pf", print_limit=30):
+def read_pfm(fpath, expected_identifier="Pf", print_limit=30, mmap=False):
     # PFM format definition: http://netpbm.sourceforge.net/doc/pfm.html
+    # with mmap=True, the returned array is a read-only view on the memory-mapped file,
+    # callers which need to modify the data have to create a copy
 
     with open(fpath, 'rb') as f:
         #  header
@@ -160,11 +235,22 @@ def read_pfm(fpath, expected_identifier="Pf", print_limit=30):
                               'Should be a non-zero number.' % line_scale[:print_limit])
 
         try:
-            data = np.fromfile(f, "%sf" % endianness)
-            data = np.reshape(data, (height, width))
-            data = np.flipud(data)
-            with np.errstate(invalid="ignore"):
-                data *= abs(scale)
+            if mmap:
+                data = np.memmap(fpath, dtype="%sf" % endianness, mode="r",
+                                 offset=f.tell(), shape=(height, width)).view(np.ndarray)
+            else:
+                data = np.fromfile(f, "%sf" % endianness)
+                data = np.reshape(data, (height, width))
+
+            # rows are stored from bottom to top, flipping creates a view with negative stride
+            data = data[::-1]
+
+            if abs(scale) != 1:
+                with np.errstate(invalid="ignore"):
+                    if mmap:
+                        data = data * abs(scale)
+                    else:
+                        data *= abs(scale)
         except:
             raise PFMExeption('Invalid binary values. '
                               'Could not create %dx%d array from input.' % (height, width))
@@ -182,6 +268,15 @@ def _get_next_line(ff):
     return next_line
 
 
+# scene parameters
+
+def read_parameters(fpath):
+    parser = ConfigParser.ConfigParser()
+    with open(fpath, "r") as f:
+        parser.readfp(f)
+    return {section: dict(parser.items(section)) for section in parser.sections()}
+
+
 # runtimes
 
 
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+
+import hashlib
+import os
+import os.path as op
+
+from toolkit import settings
+from toolkit.utils import file_io, log
+
+
+class FingerprintIndex(object):
+    """
+    Persistent index of content fingerprints of input files, e.g. ground truth,
+    masks and algorithm results. Each file is hashed again only if its size or
+    modification time changed. Derived artifacts such as cached scores record the
+    fingerprint of their inputs, which allows to check whether they are stale.
+    """
+
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.files = None
+        self.artifacts = None
+        self.changed = False
+
+    def get_fingerprint(self, fpath):
+        """Content fingerprint of the given file, None if the file does not exist."""
+        self._load()
+        fpath = op.abspath(fpath)
+
+        try:
+            stat = os.stat(fpath)
+        except OSError:
+            return None
+
+        entry = self.files.get(fpath)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            entry = {"size": stat.st_size, "mtime": stat.st_mtime, "fingerprint": hash_file(fpath)}
+            self.files[fpath] = entry
+            self.changed = True
+
+        return entry["fingerprint"]
+
+    def get_combined_fingerprint(self, input_files, parameters=None):
+        """Fingerprint of the given files in the given order and optional parameters."""
+        combined = hashlib.sha1()
+        for fpath in input_files:
+            combined.update("%s\n" % self.get_fingerprint(fpath))
+        if parameters is not None:
+            combined.update(repr(parameters))
+        return combined.hexdigest()
+
+    def is_stale(self, artifact, input_files, parameters=None):
+        """True if the artifact is missing or was created from different inputs."""
+        self._load()
+        if not op.isfile(artifact):
+            return True
+
+        fingerprint = self.artifacts.get(op.abspath(artifact))
+        return fingerprint != self.get_combined_fingerprint(input_files, parameters)
+
+    def set_up_to_date(self, artifact, input_files, parameters=None):
+        """Record that the artifact was created from the given inputs."""
+        self._load()
+        self.artifacts[op.abspath(artifact)] = self.get_combined_fingerprint(input_files, parameters)
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+
+        data = {"files": self.files, "artifacts": self.artifacts}
+        file_io.check_dir_for_fname(self.fpath)
+
+        # replace index at once, an interrupted write must not corrupt it
+        fpath_tmp = "%s.tmp" % self.fpath
+        file_io.write_json(data, fpath_tmp)
+        os.rename(fpath_tmp, self.fpath)
+        self.changed = False
+
+    def _load(self):
+        if self.files is not None:
+            return
+
+        self.files = dict()
+        self.artifacts = dict()
+
+        if op.isfile(self.fpath):
+            try:
+                data = file_io.read_json(self.fpath)
+                self.files = data["files"]
+                self.artifacts = data["artifacts"]
+            except (IOError, ValueError, KeyError) as e:
+                log.warning("Could not read fingerprints from %s: %s" % (self.fpath, e))
+
+
+def hash_file(fpath, chunk_size=2 ** 20):
+    content = hashlib.sha1()
+    with open(fpath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            content.update(chunk)
+    return content.hexdigest()
+
+
+def get_scene_files(scene):
+    # scene data is read from the bundle if it exists
+    bundle_files = [scene.bundle.fpath] if scene.bundle is not None else []
+    return scene.get_data_files() + bundle_files
+
+
+# process-wide index, call save() after modifications
+index = FingerprintIndex(settings.PATH_TO_FINGERPRINTS)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+import numpy as np
+
+
+def sort_by_group(keys, values):
+    """
+    Sort values by group with one stable sort, values are in ascending order within each group.
+    Returns the unique keys, the start and size of each group and the sorted values.
+    """
+    keys = np.ravel(keys)
+    values = np.ravel(values)
+    order = np.lexsort((values, keys))
+    sorted_keys = keys[order]
+    sorted_values = values[order]
+
+    starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    sizes = np.diff(np.append(starts, np.size(sorted_keys)))
+    return sorted_keys[starts], starts, sizes, sorted_values
+
+
+def get_grouped_medians(keys, values):
+    """
+    Median of the values for each unique key, same as np.median per group.
+    Groups with invalid values have a NaN median.
+    """
+    group_keys, starts, sizes, sorted_values = sort_by_group(keys, values)
+    if np.size(group_keys) == 0:
+        return group_keys, np.full(0, fill_value=np.nan)
+
+    # mean of the two middle elements, which coincide for an odd size
+    lower = sorted_values[starts + (sizes - 1) // 2]
+    upper = sorted_values[starts + sizes // 2]
+    medians = (lower + upper) / 2
+
+    # NaN values are sorted to the end of each group
+    medians[np.isnan(sorted_values[starts + sizes - 1])] = np.nan
+    return group_keys, medians
+
+
+def get_grouped_percentiles(keys, values, percentiles):
+    """
+    Percentiles of the values for each unique key with linear interpolation,
+    as np.percentile per group. Returns the unique keys and a matrix with shape
+    (n_groups, n_percentiles). Groups with invalid values have NaN percentiles.
+    """
+    group_keys, starts, sizes, sorted_values = sort_by_group(keys, values)
+    percentiles = np.ravel(percentiles)
+    result = np.full((np.size(group_keys), np.size(percentiles)), fill_value=np.nan)
+    if np.size(group_keys) == 0:
+        return group_keys, result
+
+    m_valid = ~np.isnan(sorted_values[starts + sizes - 1])
+    for idx_p, percentile in enumerate(percentiles):
+        positions = (sizes - 1) * (percentile / 100.)
+        below = np.floor(positions).astype(np.int64)
+        above = np.minimum(below + 1, sizes - 1)
+        weights_above = positions - below
+        result[:, idx_p] = (sorted_values[starts + below] * (1 - weights_above) +
+                            sorted_values[starts + above] * weights_above)
+
+    result[~m_valid, :] = np.nan
+    return group_keys, result
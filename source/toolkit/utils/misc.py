@@ -61,12 +61,57 @@ def resize_to_shape(data, height, width, order=1):
     return sci.zoom(data, scale_factor, order=order)
 
 
+def get_float_dtype():
+    return np.dtype(settings.FLOAT_PRECISION)
+
+
+def get_block_view(data, factor):
+    # view with shape (h, factor, w, factor, ...) on data with shape (h * factor, w * factor, ...)
+    h, w = np.shape(data)[0:2]
+    return np.reshape(data, (h // factor, factor, w // factor, factor) + np.shape(data)[2:])
+
+
+def get_block_broadcast(data):
+    # view with shape (h, 1, w, 1, ...) which broadcasts against a block view
+    return data[:, np.newaxis, :, np.newaxis]
+
+
+def upsample_nearest(data, factor):
+    # replicate each pixel to a block of factor x factor pixels
+    h, w = np.shape(data)[0:2]
+    blocks = np.broadcast_to(get_block_broadcast(data),
+                             (h, factor, w, factor) + np.shape(data)[2:])
+    return np.reshape(blocks, (h * factor, w * factor) + np.shape(data)[2:])
+
+
+def apply_upsampled(func, low_res, *high_res):
+    """
+    Apply the element-wise func to low_res and the given arrays, which may have
+    an integer multiple of its resolution. The low resolution array behaves like
+    its nearest neighbor upsampling, but the upsampled array is never allocated.
+    """
+    shape = np.shape(high_res[0])
+    factor = shape[0] // np.shape(low_res)[0]
+    if factor == 1:
+        return func(low_res, *high_res)
+
+    blocks = [get_block_view(data, factor) for data in high_res]
+    result = func(get_block_broadcast(low_res), *blocks)
+    return np.reshape(result, shape)
+
+
 def percentage(total, part):
     if total == 0:
         return np.nan
     return 100 * part / float(total)
 
 
+def percentages(totals, parts):
+    # element-wise percentage, NaN where the total is zero
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 * np.asarray(parts) / np.asarray(totals, dtype=np.float64)
+
+
 # scenes
 
 def get_available_scenes_by_category(categories=None, data_path=settings.DATA_PATH):
@@ -178,6 +223,11 @@ def get_general_metrics():
     return [MSE(), BadPix(0.01), BadPix(0.03), BadPix(0.07), Quantile(25)]
 
 
+def get_quantile_profile_metrics():
+    from toolkit.metrics import Quantile
+    return [Quantile(p, profile=settings.QUANTILE_PROFILE) for p in settings.QUANTILE_PROFILE]
+
+
 def get_region_metrics():
     from toolkit.metrics import Discontinuities, FineFattening, FineThinning, \
         BumpinessPlanes, BumpinessContinSurf, MAEPlanes, MAEContinSurf
@@ -199,6 +249,7 @@ def get_metric_groups_by_name():
         "general": get_general_metrics(),
         "stratified": get_stratified_metrics(),
         "regions": get_region_metrics(),
+        "quantile_profile": get_quantile_profile_metrics(),
         "all_wo_runtime": get_all_metrics_wo_runtime(),
         "all": get_all_metrics()
     }
@@ -263,17 +314,31 @@ def get_algo_result(algorithm, scene):
     return get_algo_result_from_dir(get_path_to_algo_data(algorithm), scene)
 
 
-def get_algo_result_from_dir(algo_dir, scene):
+def get_algo_result_from_dir(algo_dir, scene, upsample=True):
+    """
+    Algorithm results are upsampled to the resolution of the scene.
+    With settings.UPSAMPLE_BY_BLOCKS, pixels are replicated per block instead,
+    and upsample=False returns the low resolution result if gt_scale is an integer.
+    Metrics compare it to the high resolution ground truth via apply_upsampled.
+    """
     fname = get_fname_algo_result(algo_dir, scene)
-    algo_result = file_io.read_file(fname)
+    return upsample_algo_result(file_io.read_file(fname), scene, upsample=upsample)
+
+
+def upsample_algo_result(algo_result, scene, upsample=True):
+    # algorithm result at its original resolution, see get_algo_result_from_dir
     if scene.gt_scale != 1:
-        algo_result = sci.zoom(algo_result, scene.gt_scale, order=0)
+        if not settings.UPSAMPLE_BY_BLOCKS or scene.gt_scale != int(scene.gt_scale):
+            algo_result = sci.zoom(algo_result, scene.gt_scale, order=0)
+        elif upsample:
+            algo_result = upsample_nearest(algo_result, int(scene.gt_scale))
+
     return algo_result
 
 
 def get_algo_results(algorithms, scene):
     algo_results = np.full((scene.get_height(), scene.get_width(), len(algorithms)),
-                           fill_value=np.nan)
+                           fill_value=np.nan, dtype=get_float_dtype())
 
     for idx_a, algorithm in enumerate(algorithms):
         algo_results[:, :, idx_a] = get_algo_result(algorithm, scene)
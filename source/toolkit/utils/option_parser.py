@@ -294,6 +294,8 @@ class MetricOps(Ops):
 
         # prepare help text for general metrics
         general_metrics = ", ".join(m.get_display_name() for m in metric_groups_by_name["general"])
+        quantile_profile = ", ".join(m.get_display_name()
+                                     for m in metric_groups_by_name["quantile_profile"])
 
         # prepare help text for all individual metrics
         metric_keys = sorted(metrics_by_name.keys())
@@ -317,9 +319,10 @@ class MetricOps(Ops):
                                           '  stratified: special metrics of the stratified scenes\n'
                                           '  regions: region metrics of the photorealistic scenes\n'
                                           '  general: %s\n'
+                                          '  quantile_profile: %s\n'
                                           '  all_wo_runtime: applicable metrics without runtime\n'
                                           '  all: applicable metrics including runtime\n'
-                                          % (all_metrics, general_metrics))
+                                          % (all_metrics, general_metrics, quantile_profile))
         return [action]
 
 
@@ -388,6 +391,63 @@ class ThresholdOps(Ops):
         return [action]
 
 
+class PyramidScaleOps(Ops):
+
+    def __init__(self, scales=None):
+        if scales is None:
+            scales = settings.PYRAMID_SCALES
+        self.scales = scales
+
+    def add_arguments(self, parser):
+        action = parser.add_argument("--scales",
+                                     dest="scales", type=float, nargs="+", default=self.scales,
+                                     help='list of gt_scale levels to precompute\n'
+                                          'example: "--scales 2 5"\n'
+                                          'default: %s' % " ".join("%g" % s for s in self.scales))
+        return [action]
+
+
+class PrecisionOps(Ops):
+
+    def add_arguments(self, parser):
+        action = parser.add_argument("--precision",
+                                     dest="precision", action=PrecisionAction,
+                                     type=str, choices=["float32", "float64"],
+                                     help="floating point type of intermediate results\n"
+                                          "float32 requires less memory, "
+                                          "scores may differ slightly\n"
+                                          "default: %s" % settings.FLOAT_PRECISION)
+        return [action]
+
+
+class PrecisionAction(argparse.Action):
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        if values is None:
+            values = settings.FLOAT_PRECISION
+        setattr(namespace, self.dest, values)
+
+
+class MemoryOps(Ops):
+
+    def add_arguments(self, parser):
+        action = parser.add_argument("--memory_budget",
+                                     dest="memory_budget", action=MemoryAction, type=int,
+                                     help="memory budget in MB for intermediate results of the scores\n"
+                                          "scores are computed on stripes of rows, "
+                                          "unless visualizations are saved\n"
+                                          "default: full frame at once")
+        return [action]
+
+
+class MemoryAction(argparse.Action):
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        if values is None:
+            values = settings.EVALUATION_MEMORY_MB
+        setattr(namespace, self.dest, values)
+
+
 class ConverterOps(Ops):
 
     def __init__(self,
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+import numpy as np
+
+
+# number of set bits for each possible byte value
+POPCOUNT = np.asarray([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+class PackedMask(object):
+    """
+    Binary mask with eight pixels per byte, packed along the last axis.
+    Padding bits at the end of each row are always zero.
+    """
+
+    def __init__(self, bits, shape):
+        self.bits = bits
+        self.shape = tuple(shape)
+
+    @staticmethod
+    def from_bool(mask):
+        mask = np.asarray(mask, dtype=np.bool)
+        return PackedMask(np.packbits(mask, axis=-1), np.shape(mask))
+
+    @staticmethod
+    def full(shape, fill_value):
+        n_bytes = int(np.ceil(shape[-1] / 8.0))
+        mask = PackedMask(np.zeros(tuple(shape[:-1]) + (n_bytes,), dtype=np.uint8), shape)
+        if fill_value:
+            mask.bits[:] = mask._get_row_bits()
+        return mask
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def __and__(self, other):
+        self._check_shape(other)
+        return PackedMask(np.bitwise_and(self.bits, other.bits), self.shape)
+
+    def __or__(self, other):
+        self._check_shape(other)
+        return PackedMask(np.bitwise_or(self.bits, other.bits), self.shape)
+
+    def __invert__(self):
+        bits = np.invert(self.bits)
+        bits &= self._get_row_bits()
+        return PackedMask(bits, self.shape)
+
+    def __getitem__(self, rows):
+        # row selection only, columns are packed
+        bits = self.bits[rows]
+        return PackedMask(bits, bits.shape[:-1] + self.shape[-1:])
+
+    def count(self):
+        return int(np.sum(POPCOUNT[self.bits], dtype=np.int64))
+
+    def any(self):
+        return bool(np.any(self.bits))
+
+    def get_bounding_box(self):
+        # ((row_start, row_stop), (col_start, col_stop)) of all set pixels, None for an empty mask
+        rows = np.flatnonzero(np.any(self.bits, axis=-1))
+        if np.size(rows) == 0:
+            return None
+
+        cols = np.flatnonzero(np.unpackbits(np.bitwise_or.reduce(self.bits, axis=0)))
+        return (int(rows[0]), int(rows[-1]) + 1), (int(cols[0]), int(cols[-1]) + 1)
+
+    def to_bool(self):
+        width = self.shape[-1]
+        unpacked = np.unpackbits(self.bits, axis=-1)
+        if unpacked.shape[-1] != width:
+            unpacked = unpacked[..., :width]
+        return unpacked.view(np.bool)
+
+    def copy(self):
+        return PackedMask(self.bits.copy(), self.shape)
+
+    def _get_row_bits(self):
+        # all valid bits of a row set, padding bits cleared
+        width = self.shape[-1]
+        return np.packbits(np.ones(width, dtype=np.bool))
+
+    def _check_shape(self, other):
+        if self.shape != other.shape:
+            raise ValueError("Mask shapes do not match: %s vs. %s" % (self.shape, other.shape))
@@ -148,7 +148,7 @@ def pixelize(data, factor=0.1, order=0, mode="nearest", add_noise=True, noise_fa
 
     if add_noise:
         noise = noise_factor * np.random.random(np.shape(data)) - 0.5*noise_factor
-        data += noise
+        data = data + noise
 
     factor_h = h / float(int(h)/(int(1/factor)))
     factor_w = w / float(int(w)/(int(1/factor)))
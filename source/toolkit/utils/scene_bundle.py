@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+############################################################################
+#  This file is part of the 4D Light Field Benchmark.                      #
+#                                                                          #
+#  This work is licensed under the Creative Commons                        #
+#  Attribution-NonCommercial-ShareAlike 4.0 International License.         #
+#  To view a copy of this license,                                         #
+#  visit http://creativecommons.org/licenses/by-nc-sa/4.0/.                #
+#                                                                          #
+#  Authors: Katrin Honauer & Ole Johannsen                                 #
+#  Contact: contact@lightfield-analysis.net                                #
+#  Website: www.lightfield-analysis.net                                    #
+#                                                                          #
+#  The 4D Light Field Benchmark was jointly created by the University of   #
+#  Konstanz and the HCI at Heidelberg University. If you use any part of   #
+#  the benchmark, please cite our paper "A dataset and evaluation          #
+#  methodology for depth estimation on 4D light fields". Thanks!           #
+#                                                                          #
+#  @inproceedings{honauer2016benchmark,                                    #
+#    title={A dataset and evaluation methodology for depth estimation on   #
+#           4D light fields},                                              #
+#    author={Honauer, Katrin and Johannsen, Ole and Kondermann, Daniel     #
+#            and Goldluecke, Bastian},                                     #
+#    booktitle={Asian Conference on Computer Vision},                      #
+#    year={2016},                                                          #
+#    organization={Springer}                                               #
+#    }                                                                     #
+#                                                                          #
+############################################################################
+
+
+import json
+import os
+import os.path as op
+import struct
+
+import numpy as np
+
+from toolkit import settings
+from toolkit.utils import file_io, log, misc
+
+
+# Bundle layout: magic, header length (uint64), json header, arrays.
+# Each array is stored uncompressed in little endian byte order and starts
+# at a page aligned offset, hence it can be memory-mapped without copying.
+MAGIC = "LFBUNDLE"
+VERSION = 1
+ALIGNMENT = 4096
+
+
+class SceneBundleException(Exception):
+    pass
+
+
+class SceneBundle(object):
+
+    def __init__(self, fpath):
+        self.fpath = fpath
+
+        with open(fpath, "rb") as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise SceneBundleException("Not a scene bundle: %s" % fpath)
+
+            try:
+                header_length = struct.unpack("<Q", f.read(8))[0]
+                header = json.loads(f.read(header_length))
+            except (struct.error, ValueError) as e:
+                raise SceneBundleException("Could not parse header of %s: %s" % (fpath, e))
+
+        if header["version"] != VERSION:
+            raise SceneBundleException("Unsupported bundle version %s in %s. "
+                                       "Please run compile_scenes.py again." %
+                                       (header["version"], fpath))
+
+        self.parameters = header["parameters"]
+        self.arrays = header["arrays"]
+        self.data_offset = _align(len(MAGIC) + 8 + header_length)
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def get_names(self):
+        return sorted(self.arrays.keys())
+
+    def get_parameters(self):
+        return self.parameters
+
+    def get(self, name):
+        try:
+            info = self.arrays[name]
+        except KeyError:
+            raise IOError("Could not find %s in scene bundle: %s" % (name, self.fpath))
+
+        data = np.memmap(self.fpath, dtype=np.dtype(str(info["dtype"])), mode="r",
+                         offset=self.data_offset + info["offset"], shape=tuple(info["shape"]))
+        return data.view(np.ndarray)
+
+
+def get_fname_bundle(scene_dir):
+    return op.join(scene_dir, settings.SCENE_BUNDLE_NAME)
+
+
+def load_bundle(scene_dir):
+    fpath = get_fname_bundle(scene_dir)
+    if not op.isfile(fpath):
+        return None
+    return SceneBundle(fpath)
+
+
+def write_bundle(fpath, arrays, parameters):
+    entries = []
+    offset = 0
+
+    for name in sorted(arrays.keys()):
+        data = np.ascontiguousarray(arrays[name])
+        data = data.astype(data.dtype.newbyteorder("<"), copy=False)
+        entries.append((name, data, offset))
+        offset = _align(offset + data.nbytes)
+
+    array_infos = {name: {"dtype": data.dtype.str, "shape": data.shape, "offset": array_offset}
+                   for name, data, array_offset in entries}
+    header = {"version": VERSION, "parameters": parameters, "arrays": array_infos}
+    header = json.dumps(header, sort_keys=True)
+    data_offset = _align(len(MAGIC) + 8 + len(header))
+
+    file_io.check_dir_for_fname(fpath)
+    with open(fpath, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+
+        for name, data, array_offset in entries:
+            f.seek(data_offset + array_offset)
+            data.tofile(f)
+
+        # pad last array, it may be mapped with page granularity
+        f.truncate(data_offset + offset)
+
+
+def compile_scene(scene, scales=None):
+    if scales is None:
+        scales = settings.PYRAMID_SCALES
+
+    scene_dir = scene.get_data_path()
+    log.info("Compiling scene data of %s." % scene.get_display_name())
+
+    fnames = scene.get_data_files()
+    names = [op.splitext(op.basename(fname))[0] for fname in fnames]
+    arrays = dict(zip(names, file_io.read_batch(fnames)))
+
+    # precompute gt_scale levels which would otherwise be resampled at runtime
+    arrays.update(get_pyramid_levels(scene, arrays, scales))
+
+    parameters = file_io.read_parameters(op.join(scene_dir, "parameters.cfg"))
+    fpath = get_fname_bundle(scene_dir)
+    write_bundle(fpath, arrays, parameters)
+
+    log.info("Saved %d arrays to %s (%0.1f MB)." %
+             (len(arrays), fpath, os.path.getsize(fpath) / 1024. ** 2))
+    return fpath
+
+
+def get_level_name(descr, scale):
+    return "%s_scale%g" % (descr, scale)
+
+
+def get_pyramid_levels(scene, arrays, scales):
+    # levels are resampled exactly as at runtime without bundle, hence scores do not depend on the bundle
+    center_view = "input_Cam%03d" % scene.get_center_cam()
+    highres_suffix = "_%s" % settings.HIGHRES
+    levels = dict()
+
+    for scale in scales:
+        # lowres and highres versions are stored anyway
+        if scale == 1 or scale == scene.highres_scale:
+            continue
+
+        height, width = int(scene.height * scale), int(scene.width * scale)
+
+        for name, data in arrays.items():
+            # the center view is resampled from low resolution, all other data from high resolution
+            if name == center_view:
+                descr = name
+            elif name.endswith(highres_suffix):
+                descr = name[:-len(highres_suffix)]
+            else:
+                continue
+            levels[get_level_name(descr, scale)] = misc.resize_to_shape(data, height, width, order=0)
+
+    return levels
+
+
+def _align(offset):
+    return int(np.ceil(offset / float(ALIGNMENT))) * ALIGNMENT